@@ -1,9 +1,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.helpers.config import Config
+from app.helpers.executor import inference_executors
+from app.helpers.log import setup_logging
+from app.settings import SERVE_WHILE_LOADING, TRANSLATION_STORE_PREWARM_TSV
+from app.utils.jobs import job_manager
+from app.utils.persistent_cache import translation_store
 
 
 def create_app() -> FastAPI:
+    setup_logging()
+
     app = FastAPI()
 
     app.add_middleware(
@@ -14,12 +21,25 @@ def create_app() -> FastAPI:
     allow_headers=["*"],
 )
 
+    from app.views.metrics import metrics_router
     from app.views.v1.translate import translate_v1
 
     app.include_router(translate_v1)
+    app.include_router(metrics_router)
 
     @app.on_event('startup')
     async def startup_event() -> None:
-        config = Config(load_all_models=True)
+        config = Config(load_all_models=True, background_load=SERVE_WHILE_LOADING)
+
+        if translation_store.enabled and TRANSLATION_STORE_PREWARM_TSV:
+            translation_store.prewarm_from_tsv(TRANSLATION_STORE_PREWARM_TSV)
+
+        job_manager.resume()
+
+    @app.on_event('shutdown')
+    async def shutdown_event() -> None:
+        job_manager.shutdown()
+        for executor in inference_executors.values():
+            executor.shutdown()
 
     return app
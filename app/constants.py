@@ -6,4 +6,50 @@ MODEL_TAG_SEPARATOR = '-'
 
 NLLB_CHECKPOINT_IDS = ["nllb-200-distilled-1.3B", "nllb-200-distilled-600M", "nllb-200-3.3B"]
 
-M2M100_CHECKPOINT_IDS = ["m2m100_418M", "m2m100_1.2B"]
\ No newline at end of file
+M2M100_CHECKPOINT_IDS = ["m2m100_418M", "m2m100_1.2B"]
+
+# Options of the per-model `ctranslate2` config block, applied when the model
+# is loaded and on every translate_batch call
+CTRANSLATE2_LOAD_OPTIONS = ['inter_threads', 'intra_threads', 'compute_type']
+CTRANSLATE2_TRANSLATE_OPTIONS = ['beam_size', 'max_batch_size', 'batch_type', 'max_decoding_length', 'replace_unknowns']
+CTRANSLATE2_COMPUTE_TYPES = [
+    'default', 'auto', 'int8', 'int8_float32', 'int8_float16', 'int8_bfloat16',
+    'int16', 'float16', 'bfloat16', 'float32',
+]
+CTRANSLATE2_BATCH_TYPES = ['examples', 'tokens']
+
+# Tokens after which overlong segments are preferably split
+SPLIT_PUNCTUATION = {',', ';', ':', '،', '؛', '、', '，', '；', '：', '-', '–', '—'}
+
+# Model types whose translators run in the inference server when one is configured
+INFERENCE_SERVER_MODEL_TYPES = ['opus', 'opus-big', 'ctranslator2', 'm2m100', 'nllb']
+
+# NLTK Punkt sentence tokenizer models by source language code. Other
+# languages are split with the English model
+NLTK_PUNKT_DEFAULT_LANGUAGE = 'english'
+NLTK_PUNKT_LANGUAGES = {
+    'cs': 'czech',
+    'da': 'danish',
+    'de': 'german',
+    'el': 'greek',
+    'en': 'english',
+    'es': 'spanish',
+    'et': 'estonian',
+    'fi': 'finnish',
+    'fr': 'french',
+    'it': 'italian',
+    'ml': 'malayalam',
+    'nb': 'norwegian',
+    'nl': 'dutch',
+    'no': 'norwegian',
+    'pl': 'polish',
+    'pt': 'portuguese',
+    'ru': 'russian',
+    'sl': 'slovene',
+    'sv': 'swedish',
+    'tr': 'turkish',
+}
+
+# Request priority classes, see TranslationBatcher
+INTERACTIVE_PRIORITY = 'interactive'
+BULK_PRIORITY = 'bulk'
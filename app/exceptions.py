@@ -4,3 +4,11 @@ class ConfigurationException(Exception):
 
 class ModelLoadingException(Exception):
     pass
+
+
+class InferenceQueueFullException(Exception):
+    pass
+
+
+class InferenceServerException(Exception):
+    pass
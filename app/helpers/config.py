@@ -1,15 +1,37 @@
+import gc
+import hashlib
 import json
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, List
 
-from app.constants import SUPPORTED_MODEL_TYPES, MULTIMODALCODE, MODEL_TAG_SEPARATOR
+from app.constants import (
+    CTRANSLATE2_BATCH_TYPES,
+    CTRANSLATE2_COMPUTE_TYPES,
+    CTRANSLATE2_LOAD_OPTIONS,
+    CTRANSLATE2_TRANSLATE_OPTIONS,
+    MODEL_TAG_SEPARATOR,
+    MULTIMODALCODE,
+    SUPPORTED_MODEL_TYPES,
+)
 from app.exceptions import ConfigurationException, ModelLoadingException
+from app.helpers.resources import resource_registry
 from app.helpers.singleton import Singleton
 from app.settings import (
     CONFIG_JSON_PATH,
+    DEFAULT_M2M100_MODEL_TYPE,
+    DEFAULT_NLLB_MODEL_TYPE,
+    LAZY_MODEL_LOADING,
+    MODEL_LOAD_WORKERS,
+    MODEL_MEMORY_BUDGET_MB,
     MODELS_ROOT_DIR,
 )
+from app.utils.cache import translation_cache
+from app.utils.persistent_cache import translation_store
 from app.utils.pipeline import pipeline
 from app.utils.utils import (
     get_model_id,
@@ -25,14 +47,31 @@ class Config(metaclass=Singleton):
         config_file: Optional[str] = None,
         config_data: Optional[Dict] = None,
         load_all_models: bool = False,
+        lazy_load: Optional[bool] = None,
+        memory_budget_mb: Optional[float] = None,
+        background_load: bool = False,
     ):
         self.loaded_models: Dict = {}
+        self.registered_models: Dict = {}
         self.language_codes: Dict = {}
         self.languages_list: Dict = {}
         self.pair_to_model_id_map: Dict = {}
         self.config_data: Dict = config_data or {}
         self.config_file: str = config_file or CONFIG_JSON_PATH
         self.load_all_models: bool = load_all_models
+        self.lazy_load: bool = LAZY_MODEL_LOADING if lazy_load is None else lazy_load
+        self.memory_budget_mb: float = (
+            MODEL_MEMORY_BUDGET_MB if memory_budget_mb is None else memory_budget_mb
+        )
+        self.model_memory_mb: Dict[str, float] = {}
+        self._model_usage: OrderedDict = OrderedDict()
+        self._load_lock = threading.RLock()
+        self._usage_lock = threading.Lock()
+        self._languages_lock = threading.Lock()
+        self.background_load: bool = background_load
+        # Set once every model to be loaded at startup has been loaded (or
+        # registered, in lazy mode)
+        self.ready: bool = False
 
         self.warnings: List[str] = []
         self.messages: List[str] = []
@@ -42,8 +81,61 @@ class Config(metaclass=Singleton):
 
         if self.load_all_models or config_data:
             self._load_language_codes()
-            self._load_all_models()
-            self._load_languages_list()
+            if self.background_load:
+                # Serve models as they become available while the rest load
+                threading.Thread(
+                    target=self._load_all_models_in_background,
+                    name='model-loader',
+                    daemon=True,
+                ).start()
+            else:
+                self._load_all_models()
+                self._load_languages_list()
+                self.ready = True
+
+    def get_model(self, model_id: str) -> Dict:
+        """
+        Returns the loaded model for model_id. In lazy mode, registered
+        models are loaded on their first request and the least recently used
+        ones are unloaded when the memory budget is exceeded.
+        """
+        model = self.loaded_models.get(model_id)
+        if model is None:
+            with self._load_lock:
+                model = self.loaded_models.get(model_id)
+                if model is None:
+                    if not model_id in self.registered_models:
+                        raise KeyError(model_id)
+                    if not self.lazy_load:
+                        # Still being loaded in the background at startup
+                        raise ModelLoadingException(f'Model {model_id} is not loaded yet')
+                    self._load_registered_model(model_id)
+                    model = self.loaded_models[model_id]
+                    self._enforce_memory_budget(keep=model_id)
+        with self._usage_lock:
+            self._model_usage[model_id] = None
+            self._model_usage.move_to_end(model_id)
+        return model
+
+    def unload_model(self, model_id: str) -> None:
+        with self._load_lock:
+            model = self.loaded_models.pop(model_id, None)
+            self.model_memory_mb.pop(model_id, None)
+            with self._usage_lock:
+                self._model_usage.pop(model_id, None)
+        if model is None:
+            return
+        if model['batcher']:
+            model['batcher'].close()
+        self._release_model_resources(model)
+        translation_cache.invalidate(model_id)
+        gc.collect()
+        self._log_info(f'Model: {model_id} unloaded')
+
+    def _release_model_resources(self, model: Dict) -> None:
+        for key in model['resources']:
+            resource_registry.release(key)
+        model['resources'] = []
 
     def map_lang_to_closest(self, lang: str) -> str:
         if '_' in lang:
@@ -156,6 +248,50 @@ class Config(metaclass=Singleton):
                         f'`{item}` not speficied for a model. Skipping load'
                     )
                     return False
+        if 'max_source_tokens' in model_config:
+            max_source_tokens = model_config['max_source_tokens']
+            if type(max_source_tokens) is not int or max_source_tokens < 1:
+                self._log_warning(
+                    f'Invalid `max_source_tokens` {max_source_tokens!r} for a model. Skipping load'
+                )
+                return False
+        if 'ctranslate2' in model_config:
+            return self._is_valid_ctranslate2_options(model_config)
+        return True
+
+    def _is_valid_ctranslate2_options(self, model_config: Dict) -> bool:
+        options = model_config['ctranslate2']
+        model_name = model_config.get('model_path') or model_config.get('model_type')
+        if not isinstance(options, dict):
+            self._log_warning(
+                f'`ctranslate2` options of model {model_name} must be an object. Skipping load'
+            )
+            return False
+
+        # Minimum value of the integer options
+        int_options = {
+            'inter_threads': 1,
+            'intra_threads': 0,
+            'beam_size': 1,
+            'max_batch_size': 0,
+            'max_decoding_length': 1,
+        }
+        for key, value in options.items():
+            if key not in CTRANSLATE2_LOAD_OPTIONS + CTRANSLATE2_TRANSLATE_OPTIONS:
+                valid = False
+            elif key in int_options:
+                valid = type(value) is int and value >= int_options[key]
+            elif key == 'replace_unknowns':
+                valid = isinstance(value, bool)
+            elif key == 'compute_type':
+                valid = value in CTRANSLATE2_COMPUTE_TYPES
+            else:
+                valid = value in CTRANSLATE2_BATCH_TYPES
+            if not valid:
+                self._log_warning(
+                    f'Invalid `ctranslate2` option {key}: {value!r} for model {model_name}. Skipping load'
+                )
+                return False
         return True
 
     def _is_valid_model_type(self, model_type: str) -> bool:
@@ -178,40 +314,97 @@ class Config(metaclass=Singleton):
             if not self._is_valid_model_type(model_config['model_type']):
                 continue
 
-            try:
-                self._load_model(model_config)
-            except ModelLoadingException:
-                continue
+            self._register_model(model_config)
+
+        if self.lazy_load:
+            self._log_info(f'{len(self.registered_models)} models registered for lazy loading ' + str(list(self.registered_models.keys())))
+            return
+
+        # Model files are read and initialized in parallel. Registration
+        # above already fixed the model order for the languages list
+        start = time.perf_counter()
+        model_ids = list(self.registered_models.keys())
+        with ThreadPoolExecutor(
+            max_workers=MODEL_LOAD_WORKERS, thread_name_prefix='model-loader'
+        ) as executor:
+            list(executor.map(self._load_startup_model, model_ids))
+
+        self._log_info(
+            f'{len(self.loaded_models)} models loaded in {time.perf_counter() - start:.2f}s '
+            + str(list(self.loaded_models.keys()))
+        )
+
+    def _load_all_models_in_background(self) -> None:
+        try:
+            self._load_all_models()
+        except Exception:
+            logger.exception('Loading models failed')
+        self._load_languages_list()
+        self.ready = True
+
+    def _load_startup_model(self, model_id: str) -> None:
+        try:
+            self._load_registered_model(model_id)
+        except ModelLoadingException:
+            del self.registered_models[model_id]
+            return
 
-        self._log_info(f'{len(self.loaded_models)} models ' + str(list(self.loaded_models.keys())))
+        if self.background_load:
+            self._load_languages_list(log=False)
 
-    def _load_model(self, model_config: Dict) -> None:
-        model_type: str = model_config.get('model_type')
+    def _register_model(self, model_config: Dict) -> Optional[str]:
         src: Optional[str] = model_config['src'] if 'src' in model_config else MULTIMODALCODE
         tgt: Optional[str] = model_config['tgt'] if 'src' in model_config else MULTIMODALCODE
         alt_id: Optional[str] = model_config.get('alt')
-        multilingual: Optional[bool] = model_config['multilingual'] if 'multilingual' in model_config else False
-        supported_pairs: List[str] = model_config['supported_pairs'] if 'supported_pairs' in model_config else []
-        pipeline_msg: List[str] = []
         model_id: str = get_model_id(src=src, tgt=tgt, alt_id=alt_id)
         model_dir: Optional[str] = self._get_model_path(model_config, model_id)
         pretranslatechain: List[str] = self._get_pretranslators(model_config, model_id)
         if model_config.get('pretranslatechain') and not pretranslatechain:
-            return
+            return None
         posttranslatechain: List[str] = self._get_posttranslators(model_config, model_id)
         if model_config.get('posttranslatechain') and not posttranslatechain:
-            return
-        model: Dict = {
-            'model_type': model_type,
-            'multilingual': multilingual,
-            'supported_pairs': supported_pairs,
+            return None
+
+        # Check if language names exist for the language ids
+        self._validate_src_tgt(src, tgt)
+
+        # More configuration checks
+        self._validate_model_conflicts(model_config, model_id)
+
+        self.registered_models[model_id] = {
+            'model_config': model_config,
+            'model_type': model_config.get('model_type'),
+            'multilingual': model_config['multilingual'] if 'multilingual' in model_config else False,
+            'supported_pairs': model_config['supported_pairs'] if 'supported_pairs' in model_config else [],
             'src': src,
             'tgt': tgt,
-            'sentence_segmenter': None,
+            'model_dir': model_dir,
             'pretranslatechain': pretranslatechain,
             'posttranslatechain': posttranslatechain,
+        }
+        if self.lazy_load:
+            self._log_info(f'Model: {model_id} registered for lazy loading')
+        return model_id
+
+    def _load_registered_model(self, model_id: str) -> None:
+        registration: Dict = self.registered_models[model_id]
+        model_config: Dict = registration['model_config']
+        model_dir: Optional[str] = registration['model_dir']
+        pipeline_msg: List[str] = []
+        model: Dict = {
+            'model_type': registration['model_type'],
+            'multilingual': registration['multilingual'],
+            'supported_pairs': registration['supported_pairs'],
+            'src': registration['src'],
+            'tgt': registration['tgt'],
+            'sentence_segmenter': None,
+            'pretranslatechain': registration['pretranslatechain'],
+            'posttranslatechain': registration['posttranslatechain'],
             'preprocessors': [],
+            'source_splitter': None,
             'postprocessors': [],
+            'batcher': None,
+            'resources': [],
         }
         checks: Dict = {
             'bpe_ok': False,
@@ -227,20 +420,99 @@ class Config(metaclass=Singleton):
             'warn': self._log_warning,
         }
 
-        # Check if language names exist for the language ids
-        self._validate_src_tgt(src, tgt)
-
-        # More configuration checks
-        self._validate_model_conflicts(model_config, model_id)
+        start = time.perf_counter()
 
         # Load model pipeline
-        for loader in pipeline:
-            loader(**kwargs)
+        try:
+            for loader in pipeline:
+                loader(**kwargs)
+        except Exception:
+            self._release_model_resources(model)
+            raise
 
         self._log_info(f"Model: {model_id} ( {' '.join(pipeline_msg)} )")
-
-        # All good, add model to the list
+        logger.info(f'Model: {model_id} loaded in {time.perf_counter() - start:.2f}s')
+
+        # All good, add model to the list. Cached translations of a previous
+        # model with this id are no longer valid
+        translation_cache.invalidate(model_id)
+        if translation_store.enabled:
+            fingerprint = self._model_fingerprint(model_config, model_dir)
+            if translation_store.check_model(model_id, fingerprint):
+                self._log_info(f'Model: {model_id} changed, stored translations removed')
+        if model_id in self.loaded_models:
+            previous_model = self.loaded_models[model_id]
+            if previous_model['batcher']:
+                previous_model['batcher'].close()
+            self._release_model_resources(previous_model)
         self.loaded_models[model_id] = model
+        self.model_memory_mb[model_id] = self._estimate_model_memory_mb(model_config, model_dir)
+
+    def _model_fingerprint(
+        self, model_config: Dict, model_dir: Optional[str]
+    ) -> str:
+        # Hash of the model config entry and of the names, sizes and
+        # modification times of the model files
+        fingerprint = hashlib.sha256(
+            json.dumps(model_config, sort_keys=True, default=str).encode('utf-8')
+        )
+        for path in self._model_files(model_config, model_dir):
+            stat = os.stat(path)
+            fingerprint.update(f'\0{path}\0{stat.st_size}\0{stat.st_mtime_ns}'.encode('utf-8'))
+        return fingerprint.hexdigest()
+
+    def _estimate_model_memory_mb(
+        self, model_config: Dict, model_dir: Optional[str]
+    ) -> float:
+        # An explicit `memory_mb` in the model config wins. Otherwise use the
+        # size of the model files on disk as an approximation
+        if 'memory_mb' in model_config:
+            return float(model_config['memory_mb'])
+
+        size = sum(os.path.getsize(path) for path in self._model_files(model_config, model_dir))
+        return size / (1024 * 1024)
+
+    def _model_files(
+        self, model_config: Dict, model_dir: Optional[str]
+    ) -> List[str]:
+        # Files of the model on disk, including the checkpoints of model
+        # types that are found by name under MODELS_ROOT_DIR
+        model_type = model_config.get('model_type')
+        if model_type == 'opus':
+            model_dir = os.path.join(MODELS_ROOT_DIR, f"opus-mt-{model_config['src']}-{model_config['tgt']}")
+        elif model_type == 'opus-big':
+            model_dir = os.path.join(MODELS_ROOT_DIR, f"opus-mt-tc-big-{model_config['src']}-{model_config['tgt']}")
+        elif model_type in ('nllb', 'm2m100'):
+            default_checkpoint_id = DEFAULT_NLLB_MODEL_TYPE if model_type == 'nllb' else DEFAULT_M2M100_MODEL_TYPE
+            checkpoint_id = model_config.get('checkpoint_id', default_checkpoint_id)
+            if len(checkpoint_id.split('/')) == 1:
+                checkpoint_id = 'facebook/' + checkpoint_id
+            model_dir = os.path.join(MODELS_ROOT_DIR, checkpoint_id)
+
+        if not model_dir or not os.path.isdir(model_dir):
+            return []
+
+        paths = []
+        for root, _, files in os.walk(model_dir):
+            for filename in files:
+                paths.append(os.path.join(root, filename))
+        return sorted(paths)
+
+    def _enforce_memory_budget(self, keep: str) -> None:
+        if not self.memory_budget_mb:
+            return
+        with self._usage_lock:
+            least_recently_used = list(self._model_usage)
+        for model_id in least_recently_used:
+            if sum(self.model_memory_mb.values()) <= self.memory_budget_mb:
+                break
+            if model_id != keep:
+                self.unload_model(model_id)
+        if sum(self.model_memory_mb.values()) > self.memory_budget_mb:
+            self._log_warning(
+                f'Loaded models use {sum(self.model_memory_mb.values()):.0f}MB, '
+                f'over the memory budget of {self.memory_budget_mb:.0f}MB.'
+            )
 
     def _load_language_codes(self) -> None:
         if 'languages' in self.config_data:
@@ -252,45 +524,58 @@ class Config(metaclass=Singleton):
                 "Language name spefication dictionary ('languages') not found in configuration."
             )
 
-    def _load_languages_list(self) -> None:
-        for main_model_id in self.loaded_models.keys():
-            main_parsed_id = parse_model_id(main_model_id)
-            if not (main_parsed_id := parse_model_id(main_model_id)):
-                self._log_warning(f'Unable to parse model_id of {main_model_id}')
-                continue
+    def _load_languages_list(self, log: bool = True) -> None:
+        # Built aside and swapped in, since it is rebuilt while requests are
+        # served when models load in the background
+        languages_list: Dict = {}
+        pair_to_model_id_map: Dict = {}
 
-            source_main, target_main, alt_main = main_parsed_id
+        with self._languages_lock:
+            for main_model_id in list(self.registered_models.keys()):
+                if not self.lazy_load and not main_model_id in self.loaded_models:
+                    continue
 
-            models_to_add = [] #(model_id, source, target, alt)
+                if not (main_parsed_id := parse_model_id(main_model_id)):
+                    if log:
+                        self._log_warning(f'Unable to parse model_id of {main_model_id}')
+                    continue
 
-            if self.loaded_models[main_model_id]['multilingual']:
-                for model_id in self.loaded_models[main_model_id]['supported_pairs']:
-                    parsed_id = parse_model_id(model_id)
-                    if not (parsed_id := parse_model_id(model_id)):
-                        self._log_warning(f'Unable to parse multilingual model pair {model_id} of {main_model_id}')
-                        continue
-                    source, target, alt = parsed_id
+                source_main, target_main, alt_main = main_parsed_id
 
-                    if alt_main:
-                        multimodel_code = MULTIMODALCODE + MODEL_TAG_SEPARATOR + model_id + MODEL_TAG_SEPARATOR + alt_main
-                    else:
-                        multimodel_code = MULTIMODALCODE + MODEL_TAG_SEPARATOR + model_id
+                models_to_add = [] #(model_id, source, target, alt)
 
-                    models_to_add.append((multimodel_code, source, target, alt))
-            else:
-                models_to_add.append((main_model_id, source_main, target_main, alt_main))
+                if self.registered_models[main_model_id]['multilingual']:
+                    for model_id in self.registered_models[main_model_id]['supported_pairs']:
+                        if not (parsed_id := parse_model_id(model_id)):
+                            if log:
+                                self._log_warning(f'Unable to parse multilingual model pair {model_id} of {main_model_id}')
+                            continue
+                        source, target, alt = parsed_id
+
+                        if alt_main:
+                            multimodel_code = MULTIMODALCODE + MODEL_TAG_SEPARATOR + model_id + MODEL_TAG_SEPARATOR + alt_main
+                        else:
+                            multimodel_code = MULTIMODALCODE + MODEL_TAG_SEPARATOR + model_id
 
-            for model_info in models_to_add:
-                model_id, source, target, alt = model_info
-                if not source in self.languages_list:
-                    self.languages_list[source] = {}
-                if not target in self.languages_list[source]:
-                    self.languages_list[source][target] = []
+                        models_to_add.append((multimodel_code, source, target, alt))
+                else:
+                    models_to_add.append((main_model_id, source_main, target_main, alt_main))
 
-                self.languages_list[source][target].append(model_id)
-                self.pair_to_model_id_map[model_id] = main_model_id
+                for model_info in models_to_add:
+                    model_id, source, target, alt = model_info
+                    if not source in languages_list:
+                        languages_list[source] = {}
+                    if not target in languages_list[source]:
+                        languages_list[source][target] = []
 
-        self._log_info(f'Languages list: {self.languages_list}')
+                    languages_list[source][target].append(model_id)
+                    pair_to_model_id_map[model_id] = main_model_id
+
+            self.pair_to_model_id_map = pair_to_model_id_map
+            self.languages_list = languages_list
+
+        if log:
+            self._log_info(f'Languages list: {self.languages_list}')
 
     def _lookup_pair_in_languages_list(self, src, tgt, alt=None):
         if src in self.languages_list:
@@ -372,7 +657,7 @@ class Config(metaclass=Singleton):
             )
 
         # Check conflicting model ids
-        if model_id in self.loaded_models:
+        if model_id in self.registered_models:
             self._log_warning(
                 f'Overwriting model {model_id} since there are duplicate entries. '
                 'Make sure you give an `alt` id to load alternate models.'
@@ -0,0 +1,82 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.exceptions import InferenceQueueFullException
+from app.constants import BULK_PRIORITY, INTERACTIVE_PRIORITY
+from app.settings import (
+    BULK_INFERENCE_WORKERS,
+    INFERENCE_QUEUE_SIZE,
+    INFERENCE_WORKERS,
+)
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool that runs the synchronous translation pipeline off
+    the asyncio event loop. CTranslate2 and torch release the GIL while
+    decoding, so threads give real parallelism for the translator stage.
+
+    At most `max_workers` calls run at a time and at most `max_queue_size`
+    more wait for a worker; anything beyond that is rejected with
+    InferenceQueueFullException.
+    """
+
+    def __init__(self, max_workers: int, max_queue_size: int, name: str = 'inference'):
+        self.max_workers = max_workers
+        self.name = name
+        self.max_queue_size = max_queue_size
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue_size:
+                raise InferenceQueueFullException
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=self.name,
+                )
+            executor = self._executor
+
+        try:
+            future = executor.submit(functools.partial(fn, *args, **kwargs))
+        except RuntimeError:
+            # Shut down
+            self._release()
+            raise
+        # The slot is held until the call has finished in its worker thread
+        # (or was cancelled before starting), even when the awaiting
+        # coroutine is cancelled first, e.g. by a disconnected client
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future: Optional[Future] = None) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+inference_executor = InferenceExecutor(INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE)
+bulk_inference_executor = InferenceExecutor(
+    BULK_INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE, name='bulk-inference'
+)
+
+inference_executors = {
+    INTERACTIVE_PRIORITY: inference_executor,
+    BULK_PRIORITY: bulk_inference_executor,
+}
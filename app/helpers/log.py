@@ -0,0 +1,63 @@
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.settings import DEBUG_LOGGING
+
+_listener: Optional[QueueListener] = None
+
+
+class DeferredQueueHandler(QueueHandler):
+    # QueueHandler formats the message in the logging thread; leave the
+    # record as is so that formatting happens in the listener thread too
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(debug: bool = DEBUG_LOGGING, logger_name: str = 'console_logger') -> None:
+    """
+    Turns debug logging of `logger_name` on or off. When on, its handlers are
+    moved behind a queue so that formatting and writing records (stdout,
+    app.log) happen on a background thread instead of the request path.
+    When off, debug calls return after a level check.
+    """
+    global _listener
+
+    logger = logging.getLogger(logger_name)
+
+    if not debug:
+        stop_queue_logging(logger)
+        if logger.level < logging.INFO:
+            logger.setLevel(logging.INFO)
+        return
+
+    logger.setLevel(logging.DEBUG)
+    if _listener is not None:
+        return
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handlers = list(logger.handlers)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(DeferredQueueHandler(log_queue))
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_queue_logging, logger)
+
+
+def stop_queue_logging(logger: logging.Logger) -> None:
+    # Flushes the queued records and gives the handlers back to the logger
+    global _listener
+
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in list(logger.handlers):
+        if isinstance(handler, QueueHandler):
+            logger.removeHandler(handler)
+    for handler in _listener.handlers:
+        logger.addHandler(handler)
+    _listener = None
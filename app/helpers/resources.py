@@ -0,0 +1,60 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, List
+
+logger = logging.getLogger('console_logger')
+
+
+class ResourceRegistry:
+    """
+    Reference-counted registry of heavy objects shared between models, e.g.
+    CTranslate2 translators or sentencepiece processors loaded from the same
+    files with the same settings. Keys identify the resource (type, path,
+    device and compute settings); the resource is created by `factory` on
+    first acquire and dropped when its last holder releases it.
+    """
+
+    def __init__(self):
+        self._resources: Dict[Hashable, List] = {}
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        # Loads of different resources can run in parallel; concurrent
+        # acquires of the same key wait for the first one to load it
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._resources:
+                    entry = self._resources[key]
+                    entry[1] += 1
+                    return entry[0]
+
+            resource = factory()
+            # Failed loads (None) are not kept so that they can be retried
+            if resource is not None:
+                with self._lock:
+                    self._resources[key] = [resource, 1]
+            return resource
+
+    def release(self, key: Hashable) -> None:
+        with self._lock:
+            entry = self._resources.get(key)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._resources[key]
+                logger.debug(f'Released shared resource {key}')
+
+    def refcount(self, key: Hashable) -> int:
+        entry = self._resources.get(key)
+        return entry[1] if entry else 0
+
+    def __len__(self) -> int:
+        return len(self._resources)
+
+
+resource_registry = ResourceRegistry()
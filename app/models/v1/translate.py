@@ -1,4 +1,4 @@
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Literal
 
 from pydantic import BaseModel
 
@@ -8,6 +8,7 @@ class TranslationRequest(BaseModel):
     tgt: str
     alt: Optional[str] = None
     use_multi: Optional[str] = None
+    priority: Optional[Literal['interactive', 'bulk']] = None
     text: str
 
 
@@ -16,6 +17,7 @@ class BatchTranslationRequest(BaseModel):
     tgt: str
     alt: Optional[str] = None
     use_multi: Optional[str] = None
+    priority: Optional[Literal['interactive', 'bulk']] = None
     texts: List[str]
 
 
@@ -30,3 +32,17 @@ class BatchTranslationResponse(BaseModel):
 class LanguagesResponse(BaseModel):
     models: Dict
     languages: Dict
+
+
+class ReadinessResponse(BaseModel):
+    ready: bool
+    loaded_models: List[str]
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    num_texts: int
+    total_chunks: int
+    completed_chunks: int
+    error: Optional[str] = None
@@ -9,6 +9,70 @@ TRANSFORMERS_DEVICE: str = (
     0 if os.getenv('MT_API_DEVICE') == 'gpu' else -1)
 CTRANSLATE_INTER_THREADS: int = int(os.getenv('MT_API_THREADS', 0)) or 16
 
+#Debug logging of the translation pipeline, written through a background queue. Sentence contents are only logged with MT_API_DEBUG_TEXT
+DEBUG_LOGGING: bool = os.getenv('MT_API_DEBUG', '0') in ('1', 'true', 'True')
+DEBUG_LOG_TEXT: bool = os.getenv('MT_API_DEBUG_TEXT', '0') in ('1', 'true', 'True')
+
+#Number of models loaded in parallel at startup
+MODEL_LOAD_WORKERS: int = int(os.getenv('MT_API_LOAD_WORKERS', 4))
+#Start serving while models load at startup; each model becomes available as soon as it is loaded
+SERVE_WHILE_LOADING: bool = os.getenv('MT_API_SERVE_WHILE_LOADING', '0') in ('1', 'true', 'True')
+
+#Lazy loading registers models at startup and loads each one on its first request. With a memory budget (MB, 0 for none),
+#least recently used models are unloaded to stay under it. Model memory is taken from `memory_mb` in config or the size of its files
+LAZY_MODEL_LOADING: bool = os.getenv('MT_API_LAZY_LOAD', '0') in ('1', 'true', 'True')
+MODEL_MEMORY_BUDGET_MB: float = float(os.getenv('MT_API_MODEL_MEMORY_MB', 0))
+
+#Inference runs on a dedicated thread pool off the event loop. Requests beyond workers + queue size get a 503
+INFERENCE_WORKERS: int = int(os.getenv('MT_API_INFERENCE_WORKERS', 0)) or min(32, (os.cpu_count() or 1) + 4)
+INFERENCE_QUEUE_SIZE: int = int(os.getenv('MT_API_INFERENCE_QUEUE_SIZE', 64))
+#Bulk requests (e.g. /batch) run on their own smaller pool so that they can't take every worker from interactive requests
+BULK_INFERENCE_WORKERS: int = int(os.getenv('MT_API_BULK_INFERENCE_WORKERS', 4))
+
+#Address of an inference server (inference_server.py) that loads the translation models once for all the API worker processes,
+#a unix socket path or host:port. When set, workers send translator calls there instead of loading the model weights themselves
+INFERENCE_SERVER_ADDRESS: str = os.getenv('MT_API_INFERENCE_SOCKET', '')
+#Secret key the workers authenticate to the inference server with. Required with an inference server: its connections carry pickled data
+INFERENCE_SERVER_AUTHKEY: bytes = os.getenv('MT_API_INFERENCE_AUTHKEY', '').encode()
+#Batches of at least this many sentences are passed to and from a unix socket inference server through shared memory instead of the socket. 0 disables it
+INFERENCE_SHM_MIN_SENTENCES: int = int(os.getenv('MT_API_INFERENCE_SHM_MIN_SENTENCES', 256))
+
+#Number of sentences translated together by the streaming endpoint before their results are sent
+STREAM_BATCH_SIZE: int = int(os.getenv('MT_API_STREAM_BATCH_SIZE', 4))
+
+#Background translation jobs are persisted under this directory and resumed after a restart. The job API is disabled when it isn't set
+JOBS_DIR: str = os.getenv('MT_API_JOBS_DIR', '')
+#Number of texts per job chunk and number of chunks translated at the same time across all jobs
+JOB_CHUNK_SIZE: int = int(os.getenv('MT_API_JOB_CHUNK_SIZE', 64))
+JOB_WORKERS: int = int(os.getenv('MT_API_JOB_WORKERS', 2))
+
+#Cross-request micro-batching in front of each model translator (can be overridden per model with `batching` in config)
+BATCHING_ENABLED: bool = os.getenv('MT_API_BATCHING', '1') not in ('0', 'false', 'False')
+BATCH_MAX_SENTENCES: int = int(os.getenv('MT_API_BATCH_MAX_SENTENCES', 64))
+BATCH_MAX_TOKENS: int = int(os.getenv('MT_API_BATCH_MAX_TOKENS', 0)) # 0 means no token limit
+BATCH_MAX_WAIT_MS: float = float(os.getenv('MT_API_BATCH_MAX_WAIT_MS', 0))
+#Interactive requests are batched first. When bulk requests are waiting, at least this fraction of batches goes to them
+BATCH_BULK_MIN_SHARE: float = float(os.getenv('MT_API_BULK_MIN_SHARE', 0.2))
+
+#Number of sentences per generate() call for huggingface translators (can be overridden per model with `batch_size` in config)
+TRANSFORMERS_BATCH_SIZE: int = int(os.getenv('MT_API_TRANSFORMERS_BATCH_SIZE', 16))
+
+#Padded token budget of each length bucket decoded by CTranslate2 and huggingface translators, so buckets of short sentences hold more of them (can be overridden per model with `batch_tokens` in config). 0 means no token limit
+DECODE_BATCH_TOKENS: int = int(os.getenv('MT_API_DECODE_BATCH_TOKENS', 2048))
+
+#Number of (src, tgt) translation pipelines kept per multilingual huggingface model
+TRANSFORMERS_PIPELINE_CACHE_SIZE: int = int(os.getenv('MT_API_PIPELINE_CACHE_SIZE', 16))
+
+#In-memory translation cache of sentences already seen by a model. Size 0 disables it, max bytes and TTL (seconds) 0 mean no limit
+TRANSLATION_CACHE_SIZE: int = int(os.getenv('MT_API_CACHE_SIZE', 10000))
+TRANSLATION_CACHE_MAX_BYTES: int = int(os.getenv('MT_API_CACHE_MAX_BYTES', 0))
+TRANSLATION_CACHE_TTL: float = float(os.getenv('MT_API_CACHE_TTL', 0))
+
+#Persistent sentence translation store (SQLite) shared by workers and kept across restarts. Disabled when no directory is set
+TRANSLATION_STORE_DIR: str = os.getenv('MT_API_CACHE_DIR', '')
+#Optional TSV (model_id, src, tgt, source, target) of known translations loaded into the store at startup
+TRANSLATION_STORE_PREWARM_TSV: str = os.getenv('MT_API_CACHE_PREWARM_TSV', '')
+
 #Specify which NLLB model to load here by default (if not specified in config as checkpoint_id)
 DEFAULT_NLLB_MODEL_TYPE = "nllb-200-distilled-600M" # OR "nllb-200-distilled-1.3B" #"nllb-200-distilled-600M" #"nllb-200-3.3B" #facebook/nllb-200-1.3B
 
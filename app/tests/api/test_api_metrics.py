@@ -0,0 +1,26 @@
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from main import app
+from app.helpers.config import Config
+from app.tests.base_test_case import DUMMY_CONFIG_DATA
+
+
+def test_metrics_report_requests_and_stages():
+    Config(config_data=DUMMY_CONFIG_DATA)
+    client = TestClient(app)
+
+    response = client.post(
+        '/api/v1/translate', json={'src': 'en', 'tgt': 'fr', 'text': 'HELLO there.'}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    response = client.get('/metrics')
+    assert response.status_code == status.HTTP_200_OK
+    metrics = response.text
+
+    assert 'mt_api_requests_total{endpoint="translate",model_id="en-fr",src="en",tgt="fr"}' in metrics
+    for stage in ('segment', 'preprocess:lowercaser', 'queue', 'translate', 'postprocess:capitalizer'):
+        assert f'model_id="en-fr",src="en",stage="{stage}",tgt="fr"' in metrics
+    assert 'mt_api_batch_queue_depth{model_id="en-fr",priority="interactive"}' in metrics
+    assert 'mt_api_cache_hit_rate' in metrics
@@ -0,0 +1,43 @@
+import time
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from main import app
+from app.helpers.config import Config
+from app.utils.jobs import job_manager
+from app.tests.base_test_case import DUMMY_CONFIG_DATA
+
+
+def test_jobs_disabled_without_jobs_dir(monkeypatch):
+    monkeypatch.setattr(job_manager, 'jobs_dir', '')
+    client = TestClient(app)
+
+    response = client.get('/api/v1/translate/jobs/abc')
+    assert response.status_code == status.HTTP_501_NOT_IMPLEMENTED
+
+
+def test_submit_poll_and_fetch_job(monkeypatch, tmp_path):
+    monkeypatch.setattr(job_manager, 'jobs_dir', str(tmp_path))
+    Config(config_data=DUMMY_CONFIG_DATA)
+    client = TestClient(app)
+
+    response = client.post(
+        '/api/v1/translate/jobs',
+        json={'src': 'en', 'tgt': 'fr', 'texts': ['HELLO there.', 'BYE']},
+    )
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    job_id = response.json()['job_id']
+
+    for _ in range(500):
+        job = client.get(f'/api/v1/translate/jobs/{job_id}').json()
+        if job['status'] == 'completed':
+            break
+        time.sleep(0.01)
+    assert job['completed_chunks'] == job['total_chunks'] == 1
+
+    response = client.get(f'/api/v1/translate/jobs/{job_id}/result')
+    assert response.json() == {'translation': ['Hello there.', 'Bye']}
+
+    response = client.get('/api/v1/translate/jobs/unknown')
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,35 @@
+import json
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from main import app
+from app.helpers.config import Config
+from app.tests.base_test_case import DUMMY_CONFIG_DATA
+
+
+def test_stream_translation_emits_sentences_in_order():
+    Config(config_data=DUMMY_CONFIG_DATA)
+    client = TestClient(app)
+    text = ' '.join(f'SENTENCE {i}.' for i in range(10))
+
+    response = client.post(
+        '/api/v1/translate/stream', json={'src': 'en', 'tgt': 'fr', 'text': text}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['content-type'] == 'application/x-ndjson'
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == [
+        {'index': i, 'translation': f'Sentence {i}.'} for i in range(10)
+    ]
+
+
+def test_stream_translation_invalid_pair():
+    Config(config_data=DUMMY_CONFIG_DATA)
+    client = TestClient(app)
+
+    response = client.post(
+        '/api/v1/translate/stream', json={'src': 'en', 'tgt': 'xyz', 'text': 'hello'}
+    )
+    assert response.status_code == 406
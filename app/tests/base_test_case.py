@@ -3,6 +3,27 @@ from fastapi.testclient import TestClient
 from main import app
 from app.helpers.config import Config
 
+DUMMY_CONFIG_DATA = {
+    'languages': {
+        'en': 'English',
+        'fr': 'French',
+    },
+    'models': [
+        {
+            'src': 'en',
+            'tgt': 'fr',
+            'model_type': 'dummy',
+            'load': True,
+            'sentence_split': ['.', '?', '!'],
+            'pipeline': {
+                'lowercase': True,
+                'translate': True,
+                'recase': True,
+            },
+        },
+    ],
+}
+
 
 class BaseTestCase:
     def setup(self):
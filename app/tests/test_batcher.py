@@ -0,0 +1,229 @@
+import threading
+import time
+
+from app.utils.batcher import TranslationBatcher
+
+
+class RecordingTranslator:
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, src_texts, src=None, tgt=None):
+        with self.lock:
+            self.calls.append((list(src_texts), src, tgt))
+        return [f'{tgt}:{s}' for s in src_texts]
+
+
+def _translate_concurrently(batcher, requests):
+    results = [None] * len(requests)
+
+    def worker(i, sentences, src, tgt):
+        results[i] = batcher(sentences, src, tgt)
+
+    threads = [
+        threading.Thread(target=worker, args=(i, *request))
+        for i, request in enumerate(requests)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_batcher_coalesces_concurrent_requests():
+    translator = RecordingTranslator()
+    batcher = TranslationBatcher(translator, max_batch_sentences=100, max_wait_ms=200)
+    requests = [([f'sentence {i}', f'other {i}'], 'en', 'fr') for i in range(8)]
+
+    results = _translate_concurrently(batcher, requests)
+    batcher.close()
+
+    assert results == [[f'fr:sentence {i}', f'fr:other {i}'] for i in range(8)]
+    assert len(translator.calls) < len(requests)
+
+
+def test_batcher_groups_by_language_pair():
+    translator = RecordingTranslator()
+    batcher = TranslationBatcher(translator, max_batch_sentences=100, max_wait_ms=200)
+    requests = [(['a'], 'en', 'fr'), (['b'], 'en', 'rw'), (['c'], 'en', 'fr')]
+
+    results = _translate_concurrently(batcher, requests)
+    batcher.close()
+
+    assert results == [['fr:a'], ['rw:b'], ['fr:c']]
+    for sentences, src, tgt in translator.calls:
+        assert all(s in ('a', 'c') for s in sentences) == (tgt == 'fr')
+
+
+def test_batcher_respects_max_batch_sentences():
+    translator = RecordingTranslator()
+    batcher = TranslationBatcher(translator, max_batch_sentences=3, max_wait_ms=200)
+    requests = [(['a', 'b'], 'en', 'fr') for _ in range(4)]
+
+    results = _translate_concurrently(batcher, requests)
+    batcher.close()
+
+    assert results == [['fr:a', 'fr:b']] * 4
+    assert all(len(sentences) <= 3 for sentences, _, _ in translator.calls)
+
+
+def test_batcher_propagates_translator_errors():
+    def failing_translator(src_texts, src=None, tgt=None):
+        raise RuntimeError('boom')
+
+    batcher = TranslationBatcher(failing_translator)
+    try:
+        batcher(['a'], 'en', 'fr')
+    except RuntimeError as e:
+        assert str(e) == 'boom'
+    else:
+        assert False, 'expected RuntimeError'
+    finally:
+        batcher.close()
+
+
+class BlockingTranslator(RecordingTranslator):
+    """Holds the first call until released so that requests can queue up"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def __call__(self, src_texts, src=None, tgt=None):
+        self.release.wait()
+        return super().__call__(src_texts, src, tgt)
+
+
+def _submit(batcher, sentences, priority):
+    thread = threading.Thread(
+        target=batcher, args=(sentences, 'en', 'fr'), kwargs={'priority': priority}
+    )
+    thread.start()
+    return thread
+
+
+def _wait_queued(batcher, n):
+    while batcher.qsize() < n:
+        time.sleep(0.001)
+
+
+def test_batcher_serves_interactive_before_bulk():
+    translator = BlockingTranslator()
+    batcher = TranslationBatcher(translator, max_batch_sentences=1, bulk_min_share=0)
+
+    threads = [_submit(batcher, ['first'], 'bulk')]
+    time.sleep(0.05)
+    threads.append(_submit(batcher, ['b1', 'b2'], 'bulk'))
+    _wait_queued(batcher, 2)
+    threads.append(_submit(batcher, ['i1'], 'interactive'))
+    _wait_queued(batcher, 3)
+
+    translator.release.set()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+
+    assert [sentences for sentences, _, _ in translator.calls] == [
+        ['first'], ['i1'], ['b1'], ['b2']
+    ]
+
+
+def test_batcher_guarantees_bulk_share():
+    translator = BlockingTranslator()
+    batcher = TranslationBatcher(translator, max_batch_sentences=1, bulk_min_share=0.5)
+
+    threads = [_submit(batcher, ['first'], 'interactive')]
+    time.sleep(0.05)
+    threads.append(_submit(batcher, ['b1', 'b2'], 'bulk'))
+    _wait_queued(batcher, 2)
+    threads.append(_submit(batcher, ['i1', 'i2'], 'interactive'))
+    _wait_queued(batcher, 4)
+
+    translator.release.set()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+
+    assert [sentences for sentences, _, _ in translator.calls] == [
+        ['first'], ['i1'], ['b1'], ['i2'], ['b2']
+    ]
+
+
+def test_batcher_splits_long_requests():
+    translator = RecordingTranslator()
+    batcher = TranslationBatcher(translator, max_batch_sentences=2)
+
+    assert batcher(['a', 'b', 'c', 'd', 'e'], 'en', 'fr', priority='bulk') == [
+        'fr:a', 'fr:b', 'fr:c', 'fr:d', 'fr:e'
+    ]
+    batcher.close()
+    assert all(len(sentences) <= 2 for sentences, _, _ in translator.calls)
+
+
+def test_closed_batcher_translates_directly():
+    translator = RecordingTranslator()
+    batcher = TranslationBatcher(translator, name='closed')
+    assert batcher(['a'], 'en', 'fr') == ['fr:a']
+    batcher.close()
+
+    assert batcher(['b'], 'en', 'fr') == ['fr:b']
+    assert batcher._threads == []
+    assert not any(t.name == 'batcher-closed' for t in threading.enumerate())
+
+
+class ConcurrencyTranslator:
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, src_texts, src=None, tgt=None):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        return list(src_texts)
+
+
+def test_batcher_translates_batches_in_parallel():
+    translator = ConcurrencyTranslator()
+    batcher = TranslationBatcher(translator, max_batch_sentences=1, max_in_flight=4)
+    requests = [([f'sentence {i}'], 'en', 'fr') for i in range(4)]
+
+    results = _translate_concurrently(batcher, requests)
+    batcher.close()
+
+    assert results == [[f'sentence {i}'] for i in range(4)]
+    assert translator.max_running > 1
+
+    translator = ConcurrencyTranslator()
+    batcher = TranslationBatcher(translator, max_batch_sentences=1)
+    _translate_concurrently(batcher, requests)
+    batcher.close()
+    assert translator.max_running == 1
+
+
+def test_batcher_times_queue_and_translator_separately():
+    from prometheus_client import REGISTRY
+
+    def slow_translator(src_texts, src=None, tgt=None):
+        time.sleep(0.05)
+        return list(src_texts)
+
+    def stage_seconds(stage, sample='sum'):
+        labels = {'model_id': 'timed', 'src': 'en', 'tgt': 'fr', 'stage': stage}
+        return REGISTRY.get_sample_value(f'mt_api_stage_seconds_{sample}', labels) or 0
+
+    batcher = TranslationBatcher(slow_translator, max_batch_sentences=1, name='timed')
+    _translate_concurrently(batcher, [(['a'], 'en', 'fr'), (['b'], 'en', 'fr')])
+    batcher.close()
+
+    assert stage_seconds('translate', 'count') == 2
+    assert stage_seconds('queue', 'count') == 2
+    assert 0.1 <= stage_seconds('translate') < 0.2
+    # One of the requests waited for the other's translation
+    assert stage_seconds('queue') >= 0.04
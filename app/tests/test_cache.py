@@ -0,0 +1,70 @@
+import time
+
+from app.helpers.config import Config
+from app.utils.cache import TranslationCache, translation_cache
+from app.utils.translate import translate_texts
+from app.utils.utils import get_model_id
+from .base_test_case import DUMMY_CONFIG_DATA
+
+
+def test_cache_lru_eviction():
+    cache = TranslationCache(max_entries=2)
+    cache.put(('m', 'en', 'fr', 'a'), 'A')
+    cache.put(('m', 'en', 'fr', 'b'), 'B')
+    assert cache.get(('m', 'en', 'fr', 'a')) == (True, 'A')
+    cache.put(('m', 'en', 'fr', 'c'), 'C')
+
+    assert cache.get(('m', 'en', 'fr', 'b')) == (False, None)
+    assert cache.get(('m', 'en', 'fr', 'a')) == (True, 'A')
+    assert cache.get(('m', 'en', 'fr', 'c')) == (True, 'C')
+    assert cache.stats()['hits'] == 3
+    assert cache.stats()['misses'] == 1
+
+
+def test_cache_max_bytes():
+    cache = TranslationCache(max_entries=100, max_bytes=10)
+    cache.put(('m', 'en', 'fr', 'abc'), 'ABC')
+    cache.put(('m', 'en', 'fr', 'def'), 'DEF')
+    assert len(cache) == 1
+    assert cache.stats()['bytes'] == 6
+    cache.put(('m', 'en', 'fr', 'too long'), 'TOO LONG')
+    assert cache.get(('m', 'en', 'fr', 'too long')) == (False, None)
+
+
+def test_cache_ttl():
+    cache = TranslationCache(max_entries=10, ttl=0.01)
+    cache.put(('m', 'en', 'fr', 'a'), 'A')
+    time.sleep(0.02)
+    assert cache.get(('m', 'en', 'fr', 'a')) == (False, None)
+    assert len(cache) == 0
+
+
+def test_cache_invalidate_model():
+    cache = TranslationCache(max_entries=10)
+    cache.put(('m1', 'en', 'fr', 'a'), 'A')
+    cache.put(('m2', 'en', 'fr', 'a'), 'A')
+    cache.invalidate('m1')
+    assert cache.get(('m1', 'en', 'fr', 'a')) == (False, None)
+    assert cache.get(('m2', 'en', 'fr', 'a')) == (True, 'A')
+
+
+def test_translate_texts_skips_translator_on_cache_hits():
+    config = Config(config_data=DUMMY_CONFIG_DATA)
+    model_id = get_model_id('en', 'fr')
+    model = config.loaded_models[model_id]
+    calls = []
+
+    def recording_translator(src_texts, src=None, tgt=None):
+        calls.append(list(src_texts))
+        return src_texts
+
+    model['translator'] = recording_translator
+    model['batcher'] = None
+
+    assert translate_texts(model_id, ['one. two.', 'two.'], 'en', 'fr') == ['One. Two.', 'Two.']
+    assert calls == [['one.', 'two.']]
+    assert translate_texts(model_id, ['three. one.'], 'en', 'fr') == ['Three. One.']
+    assert calls == [['one.', 'two.'], ['three.']]
+
+    Config(config_data=DUMMY_CONFIG_DATA)
+    assert translation_cache.get((model_id, 'en', 'fr', 'one.')) == (False, None)
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.exceptions import InferenceQueueFullException
+from app.helpers.executor import InferenceExecutor
+
+
+def test_executor_runs_off_the_event_loop():
+    executor = InferenceExecutor(max_workers=2, max_queue_size=0)
+
+    async def main():
+        loop_thread = threading.get_ident()
+        worker_thread = await executor.run(threading.get_ident)
+        return loop_thread, worker_thread
+
+    loop_thread, worker_thread = asyncio.run(main())
+    executor.shutdown()
+    assert loop_thread != worker_thread
+
+
+def test_executor_rejects_when_queue_is_full():
+    executor = InferenceExecutor(max_workers=1, max_queue_size=1)
+    release = threading.Event()
+
+    async def main():
+        running = [
+            asyncio.ensure_future(executor.run(release.wait)),
+            asyncio.ensure_future(executor.run(release.wait)),
+        ]
+        await asyncio.sleep(0)
+        assert executor.pending == 2
+        with pytest.raises(InferenceQueueFullException):
+            await executor.run(release.wait)
+        release.set()
+        await asyncio.gather(*running)
+        assert executor.pending == 0
+
+    asyncio.run(main())
+    executor.shutdown()
+
+
+def test_executor_slot_held_until_cancelled_call_finishes():
+    executor = InferenceExecutor(max_workers=1, max_queue_size=0)
+    started = threading.Event()
+    release = threading.Event()
+
+    def work():
+        started.set()
+        release.wait()
+
+    async def main():
+        task = asyncio.ensure_future(executor.run(work))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The worker thread is still busy with the cancelled call
+        assert executor.pending == 1
+        with pytest.raises(InferenceQueueFullException):
+            await executor.run(work)
+        release.set()
+        for _ in range(100):
+            if not executor.pending:
+                break
+            await asyncio.sleep(0.01)
+        assert executor.pending == 0
+
+    asyncio.run(main())
+    executor.shutdown()
@@ -0,0 +1,125 @@
+import os
+import stat
+import threading
+
+import pytest
+
+from app.constants import BULK_PRIORITY
+from app.exceptions import ConfigurationException, InferenceServerException, ModelLoadingException
+from app.helpers.config import Config
+from app.utils import inference_server as inference
+from app.utils.inference_server import (
+    InferenceClient,
+    InferenceServer,
+    RemoteTranslator,
+    parse_address,
+)
+from app.utils.translate import get_translator
+from .base_test_case import DUMMY_CONFIG_DATA
+
+AUTHKEY = b'test'
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(inference.inference_client, 'enabled', False)
+    Config(config_data=DUMMY_CONFIG_DATA)
+    server = InferenceServer(str(tmp_path / 'inference.sock'), AUTHKEY)
+    # Listen before the clients connect; the models are set up above
+    server.start()
+    threading.Thread(target=server.serve_forever, kwargs={'load_models': False}, daemon=True).start()
+    yield server
+    server.close()
+
+
+def test_parse_address():
+    assert parse_address('/tmp/mt-api.sock') == '/tmp/mt-api.sock'
+    assert parse_address('127.0.0.1:7000') == ('127.0.0.1', 7000)
+    assert parse_address('localhost:7000') == ('localhost', 7000)
+
+
+def test_remote_translator(server):
+    client = InferenceClient(server.address, AUTHKEY)
+    translator = RemoteTranslator(client, 'en-fr')
+    assert translator(['hello there', 'how are you'], 'en', 'fr') == ['hello there', 'how are you']
+    assert translator(['again'], 'en', 'fr', priority=BULK_PRIORITY) == ['again']
+    assert translator([], 'en', 'fr') == []
+    # The connection is reused
+    assert len(client._channels) == 1
+
+    with pytest.raises(InferenceServerException):
+        RemoteTranslator(client, 'fr-en')(['bonjour'], 'fr', 'en')
+    client.close()
+
+
+def test_remote_translator_concurrent_calls(server):
+    client = InferenceClient(server.address, AUTHKEY)
+    translator = RemoteTranslator(client, 'en-fr')
+    results = {}
+
+    def translate(i):
+        results[i] = translator([f'sentence {i}'] * 3, 'en', 'fr')
+
+    threads = [threading.Thread(target=translate, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == {i: [f'sentence {i}'] * 3 for i in range(8)}
+    client.close()
+
+
+def test_inference_server_unavailable(tmp_path):
+    translator = RemoteTranslator(InferenceClient(str(tmp_path / 'missing.sock'), AUTHKEY), 'en-fr')
+    with pytest.raises(ModelLoadingException):
+        translator(['hello'], 'en', 'fr')
+
+
+def test_workers_use_remote_translator(tmp_path, monkeypatch):
+    monkeypatch.setattr(inference.inference_client, 'enabled', True)
+    config_data = {
+        'languages': {'en': 'English', 'fr': 'French'},
+        'models': [{
+            'src': 'en',
+            'tgt': 'fr',
+            'model_type': 'ctranslator2',
+            'model_path': str(tmp_path),
+            'load': True,
+            'pipeline': {'translate': True},
+        }],
+    }
+    config = Config(config_data=config_data)
+    model = config.loaded_models['en-fr']
+    assert isinstance(model['translator'], RemoteTranslator)
+    assert model['translator'].model_id == 'en-fr'
+    # Batching happens in the inference server
+    assert model['batcher'] is None
+    assert get_translator(model, BULK_PRIORITY).keywords == {'priority': BULK_PRIORITY}
+    assert any('translate-remote' in m for m in config.messages)
+
+
+def test_remote_translator_shared_memory(server):
+    client = InferenceClient(server.address, AUTHKEY, shm_min_sentences=10)
+    translator = RemoteTranslator(client, 'en-fr')
+    tokens = [[f'▁token{i}', 'ሰላም'] * 200 for i in range(100)]
+    assert translator(tokens, 'en', 'fr') == tokens
+    assert client._channels[0][1]._shm is not None
+    # Smaller batches go through the socket
+    assert translator([['a', 'b']], 'en', 'fr') == [['a', 'b']]
+    client.close()
+
+    assert not InferenceClient('127.0.0.1:7000', AUTHKEY, shm_min_sentences=10).shm_min_sentences
+
+
+def test_inference_server_requires_authkey(tmp_path):
+    address = str(tmp_path / 'inference.sock')
+    with pytest.raises(ConfigurationException):
+        InferenceServer(address, b'')
+    with pytest.raises(ConfigurationException):
+        InferenceClient('127.0.0.1:7000', b'')
+    # No inference server configured
+    assert not InferenceClient('', b'').enabled
+
+
+def test_inference_server_socket_permissions(server):
+    assert stat.S_IMODE(os.stat(server.address).st_mode) == 0o600
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+
+import pytest
+
+from app.helpers.config import Config
+from app.utils.jobs import CANCELLED, COMPLETED, JobManager
+from app.utils.utils import get_model_id
+from .base_test_case import DUMMY_CONFIG_DATA
+
+
+def wait_for(manager, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.status(job_id)
+        if job['status'] not in ('queued', 'running'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'Job {job_id} did not finish')
+
+
+def test_job_translates_in_chunks(tmp_path):
+    Config(config_data=DUMMY_CONFIG_DATA)
+    manager = JobManager(str(tmp_path), chunk_size=2, max_workers=2)
+    texts = [f'TEXT {i}. MORE' for i in range(5)]
+
+    job = manager.submit(get_model_id('en', 'fr'), texts, 'en', 'fr')
+    assert job['total_chunks'] == 3
+
+    job = wait_for(manager, job['job_id'])
+    assert job['status'] == COMPLETED
+    assert job['completed_chunks'] == 3
+    assert manager.results(job['job_id']) == [f'Text {i}. More' for i in range(5)]
+    manager.shutdown()
+
+
+def test_job_resumes_missing_chunks(tmp_path):
+    Config(config_data=DUMMY_CONFIG_DATA)
+    manager = JobManager(str(tmp_path), chunk_size=1, max_workers=1)
+    job = manager.submit(get_model_id('en', 'fr'), ['ONE', 'TWO', 'THREE'], 'en', 'fr')
+    job_id = job['job_id']
+    wait_for(manager, job_id)
+    manager.shutdown()
+
+    # Simulate a restart in the middle of the job
+    os.remove(tmp_path / job_id / 'chunks' / '1.json')
+
+    restarted = JobManager(str(tmp_path), chunk_size=1, max_workers=1)
+    restarted.resume()
+    job = wait_for(restarted, job_id)
+    assert job['status'] == COMPLETED
+    assert restarted.results(job_id) == ['One', 'Two', 'Three']
+    restarted.shutdown()
+
+
+def test_cancelled_job_has_no_results(tmp_path):
+    Config(config_data=DUMMY_CONFIG_DATA)
+    manager = JobManager(str(tmp_path), chunk_size=1, max_workers=1)
+    job = manager.submit(get_model_id('en', 'fr'), ['ONE'] * 50, 'en', 'fr')
+
+    job = manager.cancel(job['job_id'])
+    assert job['status'] == CANCELLED
+    assert manager.results(job['job_id']) is None
+    manager.shutdown()
+
+
+def test_job_state_is_shared_through_jobs_dir(tmp_path):
+    Config(config_data=DUMMY_CONFIG_DATA)
+    manager = JobManager(str(tmp_path), chunk_size=2, max_workers=1)
+    job_id = manager.submit(get_model_id('en', 'fr'), ['ONE', 'TWO', 'THREE'], 'en', 'fr')['job_id']
+    wait_for(manager, job_id)
+
+    # Another API worker process sharing the jobs dir
+    other = JobManager(str(tmp_path))
+    assert other.status(job_id)['status'] == COMPLETED
+    assert other.results(job_id) == ['One', 'Two', 'Three']
+    assert other.cancel(job_id)['status'] == COMPLETED
+    with pytest.raises(KeyError):
+        other.status('0' * 32)
+    with pytest.raises(KeyError):
+        other.status('..')
+    manager.shutdown()
+
+
+class RecordingJobManager(JobManager):
+    def __init__(self, *args, translated, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.translated = translated
+
+    def _translate(self, job, texts):
+        self.translated.extend(texts)
+        time.sleep(0.01)
+        return texts
+
+
+def test_resumed_chunks_run_once_across_workers(tmp_path):
+    Config(config_data=DUMMY_CONFIG_DATA)
+    texts = [f'text {i}' for i in range(20)]
+    # Left unfinished by a failure on an unknown model
+    submitter = JobManager(str(tmp_path), chunk_size=2, max_workers=1)
+    job_id = submitter.submit('xx-yy', texts, 'xx', 'yy')['job_id']
+    assert wait_for(submitter, job_id)['status'] == 'failed'
+    executor = submitter._executor
+    submitter.shutdown()
+    executor.shutdown(wait=True)
+    os.remove(tmp_path / job_id / 'error')
+    for chunk in range(10):
+        (tmp_path / job_id / 'chunks' / f'{chunk}.json').unlink(missing_ok=True)
+
+    # Several workers restart and resume the same job at once
+    translated = []
+    workers = [RecordingJobManager(str(tmp_path), max_workers=2, translated=translated) for _ in range(3)]
+    threads = [threading.Thread(target=worker.resume) for worker in workers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert wait_for(workers[0], job_id)['status'] == COMPLETED
+    assert sorted(translated) == sorted(texts)
+    assert workers[1].results(job_id) == texts
+    for worker in workers:
+        worker.shutdown()
+
+
+def test_shutdown_cancels_queued_chunks(tmp_path):
+    Config(config_data=DUMMY_CONFIG_DATA)
+    translated = []
+    manager = RecordingJobManager(str(tmp_path), chunk_size=1, max_workers=1, translated=translated)
+    job_id = manager.submit('en-fr', [f'text {i}' for i in range(50)], 'en', 'fr')['job_id']
+    manager.shutdown()
+    time.sleep(0.05)
+    # The chunks that hadn't started are left for resume()
+    assert len(translated) < 50
+    assert manager.status(job_id)['status'] in ('queued', 'running')
@@ -0,0 +1,68 @@
+import threading
+
+from app.helpers.config import Config
+from app.utils.translate import translate_text
+
+LAZY_CONFIG_DATA = {
+    'languages': {
+        'en': 'English',
+        'fr': 'French',
+        'de': 'German',
+    },
+    'models': [
+        {
+            'src': 'en',
+            'tgt': tgt,
+            'model_type': 'dummy',
+            'load': True,
+            'memory_mb': 100,
+            'pipeline': {
+                'translate': True,
+                'recase': True,
+            },
+        }
+        for tgt in ['fr', 'de']
+    ],
+}
+
+
+def test_lazy_models_are_registered_but_not_loaded():
+    config = Config(config_data=LAZY_CONFIG_DATA, lazy_load=True)
+
+    assert config.loaded_models == {}
+    assert list(config.registered_models) == ['en-fr', 'en-de']
+    assert config.languages_list == {'en': {'fr': ['en-fr'], 'de': ['en-de']}}
+
+
+def test_lazy_model_loads_on_first_request():
+    config = Config(config_data=LAZY_CONFIG_DATA, lazy_load=True)
+
+    assert translate_text('en-fr', 'hello', 'en', 'fr') == 'Hello'
+    assert list(config.loaded_models) == ['en-fr']
+    assert config.model_memory_mb == {'en-fr': 100.0}
+
+
+def test_lazy_models_unloaded_over_memory_budget():
+    config = Config(config_data=LAZY_CONFIG_DATA, lazy_load=True, memory_budget_mb=150)
+
+    translate_text('en-fr', 'hello', 'en', 'fr')
+    translate_text('en-de', 'hello', 'en', 'de')
+    assert list(config.loaded_models) == ['en-de']
+
+    translate_text('en-fr', 'hello', 'en', 'fr')
+    assert list(config.loaded_models) == ['en-fr']
+    assert 'Model: en-de unloaded' in config.messages
+
+
+def test_unloaded_model_batcher_is_not_restarted():
+    config = Config(config_data=LAZY_CONFIG_DATA, lazy_load=True, memory_budget_mb=150)
+    held = config.get_model('en-fr')
+    assert held['batcher'](['hello'], 'en', 'fr') == ['hello']
+
+    config.get_model('en-de')
+    assert list(config.loaded_models) == ['en-de']
+    # A request still holding the evicted model
+    threads = set(threading.enumerate())
+    assert held['batcher'](['again'], 'en', 'fr') == ['again']
+    assert held['batcher']._threads == []
+    assert set(threading.enumerate()) <= threads
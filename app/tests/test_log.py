@@ -0,0 +1,28 @@
+import logging
+
+from app.helpers.log import DeferredQueueHandler, setup_logging
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_debug_logging_goes_through_queue():
+    logger = logging.getLogger('test_debug_logger')
+    handler = ListHandler()
+    logger.addHandler(handler)
+
+    setup_logging(debug=True, logger_name='test_debug_logger')
+    assert logger.isEnabledFor(logging.DEBUG)
+    assert [type(h) for h in logger.handlers] == [DeferredQueueHandler]
+    logger.debug('translated %d sentences', 3)
+
+    setup_logging(debug=False, logger_name='test_debug_logger')
+    assert not logger.isEnabledFor(logging.DEBUG)
+    assert logger.handlers == [handler]
+    assert handler.messages == ['translated 3 sentences']
@@ -0,0 +1,68 @@
+import time
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from main import app
+from app.helpers.config import Config
+
+PARALLEL_CONFIG_DATA = {
+    'languages': {
+        'en': 'English',
+        'fr': 'French',
+        'de': 'German',
+        'tr': 'Turkish',
+    },
+    'models': [
+        {
+            'src': 'en',
+            'tgt': tgt,
+            'model_type': 'dummy',
+            'load': True,
+            'pipeline': {
+                'translate': True,
+            },
+        }
+        for tgt in ['fr', 'de', 'tr']
+    ],
+}
+
+
+def test_models_load_in_config_order():
+    config = Config(config_data=PARALLEL_CONFIG_DATA)
+
+    assert config.ready
+    assert sorted(config.loaded_models) == ['en-de', 'en-fr', 'en-tr']
+    assert list(config.languages_list['en']) == ['fr', 'de', 'tr']
+
+
+def test_background_loading_sets_ready():
+    config = Config(config_data=PARALLEL_CONFIG_DATA, background_load=True)
+
+    deadline = time.monotonic() + 10
+    while not config.ready and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert config.ready
+    assert list(config.languages_list['en']) == ['fr', 'de', 'tr']
+
+    client = TestClient(app)
+    response = client.get('/api/v1/translate/ready')
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()['ready'] is True
+    assert sorted(response.json()['loaded_models']) == ['en-de', 'en-fr', 'en-tr']
+
+
+def test_translate_answers_503_while_loading():
+    config = Config(config_data=PARALLEL_CONFIG_DATA)
+    config.ready = False
+    config.languages_list = {}
+
+    client = TestClient(app)
+    response = client.get('/api/v1/translate/ready')
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    response = client.post(
+        '/api/v1/translate', json={'src': 'en', 'tgt': 'fr', 'text': 'hello'}
+    )
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
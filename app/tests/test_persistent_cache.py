@@ -0,0 +1,101 @@
+import copy
+import os
+
+from app.helpers import config as config_module
+from app.helpers.config import Config
+from app.utils import translate
+from app.utils.persistent_cache import PersistentTranslationStore
+from app.utils.translate import translate_texts
+from app.utils.utils import get_model_id
+from .base_test_case import DUMMY_CONFIG_DATA
+
+
+def test_store_put_and_get(tmp_path):
+    store = PersistentTranslationStore(str(tmp_path))
+    store.put_many('en-fr', 'en', 'fr', [('hello', 'bonjour'), ('yes', 'oui')])
+
+    assert store.get_many('en-fr', 'en', 'fr', ['hello', 'no', 'yes']) == {
+        'hello': 'bonjour',
+        'yes': 'oui',
+    }
+    assert store.get_many('en-fr', 'en', 'de', ['hello']) == {}
+
+    # A second store on the same directory sees the same translations
+    other_store = PersistentTranslationStore(str(tmp_path))
+    assert other_store.get_many('en-fr', 'en', 'fr', ['hello']) == {'hello': 'bonjour'}
+
+    store.invalidate('en-fr')
+    assert other_store.get_many('en-fr', 'en', 'fr', ['hello']) == {}
+
+
+def test_store_check_model(tmp_path):
+    store = PersistentTranslationStore(str(tmp_path))
+    assert not store.check_model('en-fr', 'a')
+    store.put_many('en-fr', 'en', 'fr', [('hello', 'bonjour')])
+    store.put_many('en-de', 'en', 'de', [('hello', 'hallo')])
+
+    assert not store.check_model('en-fr', 'a')
+    assert store.get_many('en-fr', 'en', 'fr', ['hello']) == {'hello': 'bonjour'}
+
+    # Only the changed model loses its translations
+    assert store.check_model('en-fr', 'b')
+    assert store.get_many('en-fr', 'en', 'fr', ['hello']) == {}
+    assert store.get_many('en-de', 'en', 'de', ['hello']) == {'hello': 'hallo'}
+
+
+def test_store_prewarm_from_tsv(tmp_path):
+    tsv_path = tmp_path / 'known.tsv'
+    tsv_path.write_text(
+        'en-fr\ten\tfr\tHello.\tBonjour.\n'
+        'broken line\n'
+        'en-fr\ten\tfr\t"Quoted"\t«Cité»\n',
+        encoding='utf-8',
+    )
+    store = PersistentTranslationStore(str(tmp_path / 'store'))
+
+    assert store.prewarm_from_tsv(str(tsv_path)) == 2
+    assert store.get_many('en-fr', 'en', 'fr', ['Hello.', '"Quoted"']) == {
+        'Hello.': 'Bonjour.',
+        '"Quoted"': '«Cité»',
+    }
+
+
+def test_translate_texts_uses_store(tmp_path, monkeypatch):
+    store = PersistentTranslationStore(str(tmp_path))
+    store.put_many('en-fr', 'en', 'fr', [('Known.', 'Connu.')])
+    monkeypatch.setattr(translate, 'translation_store', store)
+    Config(config_data=DUMMY_CONFIG_DATA)
+    model_id = get_model_id('en', 'fr')
+
+    assert translate_texts(model_id, ['Known. NEW.'], 'en', 'fr') == ['Connu. New.']
+    assert store.get_many(model_id, 'en', 'fr', ['NEW.']) == {'NEW.': 'New.'}
+
+
+def test_changed_model_invalidates_store(tmp_path, monkeypatch):
+    store = PersistentTranslationStore(str(tmp_path / 'store'))
+    monkeypatch.setattr(config_module, 'translation_store', store)
+    monkeypatch.setattr(config_module, 'MODELS_ROOT_DIR', str(tmp_path))
+    model_file = tmp_path / 'dummy-en-fr' / 'model.bin'
+    model_file.parent.mkdir()
+    model_file.write_bytes(b'weights')
+    config_data = copy.deepcopy(DUMMY_CONFIG_DATA)
+    config_data['models'][0]['model_path'] = 'dummy-en-fr'
+    model_id = get_model_id('en', 'fr')
+
+    def reload_with_stored_translation(config_data):
+        store.put_many(model_id, 'en', 'fr', [('Known.', 'Connu.')])
+        Config(config_data=config_data)
+        return store.get_many(model_id, 'en', 'fr', ['Known.'])
+
+    Config(config_data=config_data)
+    # Same config and files
+    assert reload_with_stored_translation(config_data) == {'Known.': 'Connu.'}
+
+    # Model files replaced under the same id
+    model_file.write_bytes(b'new weights')
+    os.utime(model_file, ns=(0, 0))
+    assert reload_with_stored_translation(config_data) == {}
+
+    # Model config changed
+    config_data['models'][0]['pipeline']['recase'] = False
+    assert reload_with_stored_translation(config_data) == {}
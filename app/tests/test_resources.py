@@ -0,0 +1,82 @@
+import pytest
+
+from app.helpers.config import Config
+from app.helpers.resources import ResourceRegistry, resource_registry
+
+
+def test_registry_shares_and_refcounts():
+    registry = ResourceRegistry()
+    created = []
+
+    def factory():
+        created.append(object())
+        return created[-1]
+
+    first = registry.acquire(('sentencepiece', 'sp.model'), factory)
+    second = registry.acquire(('sentencepiece', 'sp.model'), factory)
+    assert first is second
+    assert len(created) == 1
+    assert registry.refcount(('sentencepiece', 'sp.model')) == 2
+
+    registry.release(('sentencepiece', 'sp.model'))
+    assert registry.refcount(('sentencepiece', 'sp.model')) == 1
+    registry.release(('sentencepiece', 'sp.model'))
+    assert len(registry) == 0
+
+    registry.acquire(('sentencepiece', 'sp.model'), factory)
+    assert len(created) == 2
+
+
+def test_registry_does_not_keep_failed_loads():
+    registry = ResourceRegistry()
+    assert registry.acquire('bpe', lambda: None) is None
+    assert len(registry) == 0
+
+
+def _train_sentencepiece_model(model_dir):
+    spm = pytest.importorskip('sentencepiece')
+    sentences = [
+        'the quick brown fox jumps over the lazy dog',
+        'hello world how are you doing today',
+        'machine translation models translate sentences',
+    ] * 20
+    spm.SentencePieceTrainer.train(
+        sentence_iterator=iter(sentences),
+        model_prefix=str(model_dir / 'sp'),
+        vocab_size=40,
+        minloglevel=2,
+    )
+
+
+def test_models_share_sentencepiece_processor(tmp_path):
+    _train_sentencepiece_model(tmp_path)
+    model_config = {
+        'model_type': 'dummy',
+        'model_path': str(tmp_path),
+        'src_sentencepiece_model': 'sp.model',
+        'tgt_sentencepiece_model': 'sp.model',
+        'load': True,
+        'pipeline': {
+            'sentencepiece': True,
+            'translate': True,
+        },
+    }
+    config_data = {
+        'languages': {'en': 'English', 'fr': 'French'},
+        'models': [
+            {**model_config, 'src': 'en', 'tgt': 'fr', 'alt': alt}
+            for alt in ['education', 'tourism']
+        ],
+    }
+    config = Config(config_data=config_data)
+
+    key = ('sentencepiece', str(tmp_path / 'sp.model'))
+    assert resource_registry.refcount(key) == 4
+    education = config.loaded_models['en-fr-education']
+    tourism = config.loaded_models['en-fr-tourism']
+    assert education['resources'] == tourism['resources'] == [key, key]
+
+    config.unload_model('en-fr-education')
+    assert resource_registry.refcount(key) == 2
+    config.unload_model('en-fr-tourism')
+    assert resource_registry.refcount(key) == 0
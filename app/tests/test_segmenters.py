@@ -0,0 +1,107 @@
+import pickle
+
+import nltk
+import pytest
+from nltk.tokenize.punkt import PunktSentenceTokenizer
+
+from app.helpers.config import Config
+from app.helpers.resources import resource_registry
+from app.utils.segmenters import (
+    get_long_segment_splitter,
+    join_segment_pieces,
+    load_punkt,
+    punkt_language,
+    split_long_segment,
+)
+
+
+@pytest.fixture
+def punkt_data(tmp_path, monkeypatch):
+    # Minimal punkt data with an English and a French model, the French one
+    # knowing that "Mme." is an abbreviation
+    english = PunktSentenceTokenizer()
+    french = PunktSentenceTokenizer()
+    french._params.abbrev_types.add('mme')
+    # nltk looks the pickles up under punkt/ and reads them from punkt/PY3/
+    for punkt_dir in (tmp_path / 'tokenizers' / 'punkt', tmp_path / 'tokenizers' / 'punkt' / 'PY3'):
+        punkt_dir.mkdir(parents=True, exist_ok=True)
+        for language, tokenizer in [('english', english), ('french', french)]:
+            with open(punkt_dir / f'{language}.pickle', 'wb') as f:
+                pickle.dump(tokenizer, f)
+    monkeypatch.setattr(nltk.data, 'path', [str(tmp_path)])
+    nltk.data._resource_cache.clear()
+    yield
+    nltk.data._resource_cache.clear()
+
+
+def nltk_config(*srcs):
+    return {
+        'languages': {src: src for src in srcs + ('en',)},
+        'models': [
+            {
+                'src': src,
+                'tgt': 'en',
+                'model_type': 'dummy',
+                'load': True,
+                'sentence_split': 'nltk',
+                'pipeline': {'translate': True},
+            }
+            for src in srcs
+        ],
+    }
+
+
+def test_punkt_language():
+    assert punkt_language('fr') == 'french'
+    assert punkt_language('tr') == 'turkish'
+    assert punkt_language('ti') == 'english'
+
+
+def test_load_punkt_falls_back_to_english(punkt_data):
+    assert load_punkt('french') is not load_punkt('english')
+    assert load_punkt('german') is load_punkt('english')
+
+
+def test_nltk_segmenter_uses_source_language(punkt_data):
+    config = Config(config_data=nltk_config('fr', 'de', 'ti'))
+    text = 'Bonjour Mme. Dupont. Ça va?'
+    fr_segmenter = config.loaded_models['fr-en']['sentence_segmenter']
+    assert fr_segmenter.__name__ == 'nltk_sentence_segmenter'
+    assert fr_segmenter(text) == ['Bonjour Mme. Dupont.', 'Ça va?']
+    assert config.loaded_models['ti-en']['sentence_segmenter'](text) == ['Bonjour Mme.', 'Dupont.', 'Ça va?']
+
+    # There is no German data here, so de-en falls back to English
+    assert config.loaded_models['de-en']['sentence_segmenter'](text) == ['Bonjour Mme.', 'Dupont.', 'Ça va?']
+    assert resource_registry.refcount(('punkt', 'french')) == 1
+    assert resource_registry.refcount(('punkt', 'german')) == 1
+    assert resource_registry.refcount(('punkt', 'english')) == 1
+
+
+def test_nltk_segmenter_without_punkt_data(tmp_path, monkeypatch):
+    monkeypatch.setattr(nltk.data, 'path', [str(tmp_path)])
+    config = Config(config_data=nltk_config('it'))
+    assert 'it-en' not in config.loaded_models
+    assert any('punkt data not found' in w for w in config.warnings)
+
+
+def test_split_long_segment_at_safe_boundaries():
+    # After punctuation in the second half of a piece, else at the last word boundary
+    assert split_long_segment('a b c , d e f g h'.split(), 6) == [['a', 'b', 'c', ','], ['d', 'e', 'f', 'g', 'h']]
+    assert split_long_segment(', a b c d e'.split(), 4) == [[',', 'a', 'b', 'c'], ['d', 'e']]
+    # Not inside BPE or sentencepiece words
+    assert split_long_segment(['a@@', 'b', 'c@@', 'd@@', 'e', 'f'], 4) == [['a@@', 'b'], ['c@@', 'd@@', 'e', 'f']]
+    assert split_long_segment(['▁a', 'b', '▁c', 'd', 'e', '▁f', ',', '▁g'], 4) == [['▁a', 'b'], ['▁c', 'd', 'e'], ['▁f', ',', '▁g']]
+    # A word longer than the limit is cut anyway
+    assert split_long_segment(['a@@', 'b@@', 'c@@', 'd'], 2) == [['a@@', 'b@@'], ['c@@', 'd']]
+
+
+def test_long_segment_splitter_roundtrip():
+    splitter = get_long_segment_splitter(3)
+    batch = [['▁a', '▁b', '▁c', '▁d'], ['▁e']]
+    pieces, counts = splitter(batch)
+    assert pieces == [['▁a', '▁b', '▁c'], ['▁d'], ['▁e']]
+    assert join_segment_pieces(pieces, counts) == batch
+
+    pieces, counts = splitter(['one two three four five', 'six'])
+    assert pieces == ['one two three', 'four five', 'six']
+    assert join_segment_pieces(pieces, counts) == ['one two three four five', 'six']
@@ -0,0 +1,60 @@
+import pickle
+
+from app.utils.shared_batches import (
+    SharedBatchBuffer,
+    attach_shared_memory,
+    decode_batch,
+    encode_batch,
+    read_batch,
+)
+
+
+def test_shared_batch_buffer():
+    buffer = SharedBatchBuffer(1024)
+    try:
+        batch = [['▁hello', '▁wörld'], [], ['ሰላም']]
+        ref = buffer.write(batch)
+        assert buffer.read(ref) == batch
+
+        # Another process attaches to the buffer by its name
+        shm = attach_shared_memory(ref.name)
+        assert read_batch(shm, ref) == batch
+        shm.close()
+    finally:
+        buffer.close()
+
+
+def test_shared_batch_buffer_grows():
+    buffer = SharedBatchBuffer(64)
+    try:
+        small = buffer.write([['a', 'b']])
+        batch = [[f'token{i}' for i in range(50)]] * 20
+        ref = buffer.write(batch)
+        assert ref.name != small.name
+        assert buffer.size >= 4 * ref.size
+        assert buffer.read(ref) == batch
+    finally:
+        buffer.close()
+
+
+def test_batch_encoding_roundtrip():
+    for batch in [
+        [],
+        [[]],
+        [['▁hello', '▁wörld'], [], ['ሰላም', 'a@@', 'b']],
+        ['Hello there.', '', 'ሰላም'],
+        [''],
+        # Pickled
+        [('a', 'b')],
+        ['nul\0inside'],
+        [['nul\0inside']],
+        [[1, 2]],
+    ]:
+        assert decode_batch(memoryview(encode_batch(batch))) == batch
+
+
+def test_token_batch_encoding_is_compact():
+    batch = ['▁the ▁quick ▁brown ▁fox ▁jumps'.split() for _ in range(1000)]
+    data = encode_batch(batch)
+    assert data[:1] == b'T'
+    assert len(data) < len(pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL))
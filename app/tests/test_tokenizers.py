@@ -0,0 +1,47 @@
+import random
+
+from app.utils.tokenizers import get_custom_tokenizer, tokenize_with_punkset
+
+TI_PUNKSET = ['፧', '።', '፨', '?', '!', ':', '“', '”', '"', '—', '-']
+
+
+def char_loop_tokenize(doc, punkset):
+    # Character by character splitter that the compiled one replaced
+    tokens = []
+    doc = ' '.join(doc.split())
+    curr_sent = ''
+    for c in doc:
+        curr_sent += c
+        if c in punkset:
+            tokens.append(curr_sent.strip())
+            curr_sent = ''
+    if curr_sent:
+        tokens.append(curr_sent.strip())
+    return tokens
+
+
+def test_custom_tokenizer():
+    segmenter = get_custom_tokenizer(['.', '?', '!'])
+    assert segmenter.__name__ == 'custom_sentence_segmenter'
+    assert segmenter('Hello  there.How are\nyou?  Fine') == ['Hello there.', 'How are you?', 'Fine']
+    assert segmenter('') == []
+    assert segmenter('   ') == []
+    assert segmenter('...') == ['.', '.', '.']
+
+
+def test_tokenize_with_punkset_special_characters():
+    punkset = [']', '^', '-', '\\', '.']
+    assert tokenize_with_punkset('a]b^c-d\\e.f', punkset) == ['a]', 'b^', 'c-', 'd\\', 'e.', 'f']
+    # Multi-character entries never matched a single character
+    assert tokenize_with_punkset('a... b', ['...']) == ['a... b']
+    assert tokenize_with_punkset('no punctuation here', []) == ['no punctuation here']
+
+
+def test_tokenize_with_punkset_matches_char_loop():
+    rng = random.Random(0)
+    alphabet = 'ሰላም ትግርኛ ab ' + ''.join(TI_PUNKSET) + '.\n\t'
+    for punkset in (TI_PUNKSET, ['.', '?', '!'], [' '], []):
+        segmenter = get_custom_tokenizer(punkset)
+        for _ in range(300):
+            doc = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+            assert segmenter(doc) == char_loop_tokenize(doc, punkset), (doc, punkset)
@@ -0,0 +1,87 @@
+import pytest
+
+from app.helpers.config import Config
+from app.utils.translate import translate_text, translate_texts
+from app.utils.utils import get_model_id
+from .base_test_case import DUMMY_CONFIG_DATA
+
+
+def test_translate_text_dummy():
+    Config(config_data=DUMMY_CONFIG_DATA)
+    model_id = get_model_id('en', 'fr')
+    translation = translate_text(model_id, 'HELLO there. HOW are you?', 'en', 'fr')
+    assert translation == 'Hello there. How are you?'
+
+
+def test_translate_texts_reassembles_by_offset():
+    Config(config_data=DUMMY_CONFIG_DATA)
+    model_id = get_model_id('en', 'fr')
+    texts = ['ONE. TWO! three?', '', 'four', 'FIVE. six.']
+    translations = translate_texts(model_id, texts, 'en', 'fr')
+    assert translations == ['One. Two! Three?', '', 'Four', 'Five. Six.']
+
+
+def test_translate_texts_empty_batch():
+    Config(config_data=DUMMY_CONFIG_DATA)
+    model_id = get_model_id('en', 'fr')
+    assert translate_texts(model_id, [], 'en', 'fr') == []
+
+
+def test_translate_texts_sentencepiece_batch_roundtrip(tmp_path):
+    spm = pytest.importorskip('sentencepiece')
+    spm.SentencePieceTrainer.train(
+        sentence_iterator=iter(['the quick brown fox jumps over the lazy dog', 'hello world how are you'] * 20),
+        model_prefix=str(tmp_path / 'sp'),
+        vocab_size=30,
+        minloglevel=2,
+    )
+    config_data = {
+        'languages': {'en': 'English', 'fr': 'French'},
+        'models': [{
+            'src': 'en',
+            'tgt': 'fr',
+            'model_type': 'dummy',
+            'model_path': str(tmp_path),
+            'src_sentencepiece_model': 'sp.model',
+            'tgt_sentencepiece_model': 'sp.model',
+            'load': True,
+            'sentence_split': ['.'],
+            'pipeline': {'sentencepiece': True, 'translate': True},
+        }],
+    }
+    Config(config_data=config_data)
+    model_id = get_model_id('en', 'fr')
+    texts = ['hello world. the lazy fox.', 'how are you']
+    # The dummy translator hands back the sentencepiece pieces unchanged
+    assert translate_texts(model_id, texts, 'en', 'fr') == texts
+
+
+def test_translate_texts_splits_long_segments():
+    config_data = {
+        'languages': {'en': 'English', 'fr': 'French'},
+        'models': [{
+            'src': 'en',
+            'tgt': 'fr',
+            'model_type': 'dummy',
+            'load': True,
+            'max_source_tokens': 4,
+            'batching': False,
+            'pipeline': {'translate': True, 'recase': True},
+        }],
+    }
+    config = Config(config_data=config_data)
+    translated = []
+
+    def translator(src_texts, src=None, tgt=None):
+        translated.extend(src_texts)
+        return src_texts
+
+    config.loaded_models['en-fr']['translator'] = translator
+    texts = ['one two three, four five six seven eight nine', 'hi there']
+    # The pieces are joined back before recasing
+    assert translate_texts('en-fr', texts, 'en', 'fr') == ['One two three, four five six seven eight nine', 'Hi there']
+    assert translated == ['one two three,', 'four five six seven', 'eight nine', 'hi there']
+
+    config = Config(config_data={**config_data, 'models': [{**config_data['models'][0], 'max_source_tokens': 0}]})
+    assert not config.loaded_models
+    assert config.warnings == ['Invalid `max_source_tokens` 0 for a model. Skipping load']
@@ -0,0 +1,136 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.helpers.config import Config
+from app.settings import TRANSFORMERS_PIPELINE_CACHE_SIZE
+from app.utils.translators import (
+    dummy_translator,
+    get_batch_ctranslator,
+    pair_pipeline_cache,
+    pipeline_translate_batch,
+)
+
+
+class FakeCTranslator:
+    def __init__(self):
+        self.calls = []
+
+    def translate_batch(self, src_texts, **kwargs):
+        self.calls.append(kwargs)
+        return [SimpleNamespace(hypotheses=[list(reversed(tokens))]) for tokens in src_texts]
+
+
+class FakePipeline:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, max_length=None, batch_size=None):
+        self.calls.append(list(texts))
+        return [{'translation_text': text.upper()} for text in texts]
+
+
+def test_pipeline_translate_batch_restores_order():
+    fake_pipeline = FakePipeline()
+    src_texts = ['a long sentence here', 'hi', 'medium one', 'x']
+    translations = pipeline_translate_batch(fake_pipeline, src_texts, batch_size=2)
+    assert translations == [text.upper() for text in src_texts]
+    assert fake_pipeline.calls == [['x', 'hi'], ['medium one', 'a long sentence here']]
+
+
+def test_pipeline_translate_batch_token_budget():
+    fake_pipeline = FakePipeline()
+    # The batch isn't tokenized just to measure it
+    fake_pipeline.tokenizer = lambda texts: pytest.fail('tokenized')
+    src_texts = ['a' * 12, 'b' * 12, 'c', 'd']
+    # About 4 characters per token
+    pipeline_translate_batch(fake_pipeline, src_texts, batch_size=8, max_tokens=10)
+    assert fake_pipeline.calls == [['c', 'd', 'a' * 12], ['b' * 12]]
+
+
+def test_dummy_translator():
+    assert dummy_translator(['a', 'b'], 'en', 'fr') == ['a', 'b']
+
+
+def test_batch_ctranslator_translate_options():
+    ctranslator = FakeCTranslator()
+    options = {'beam_size': 1, 'batch_type': 'tokens', 'max_batch_size': 1024}
+    translator = get_batch_ctranslator(ctranslator, translate_options=options)
+    assert translator([['a', 'b'], ['c']]) == [['b', 'a'], ['c']]
+    assert ctranslator.calls == [options]
+
+    multilingual = get_batch_ctranslator(ctranslator, is_multilingual=True, translate_options=options)
+    assert multilingual([['a']], 'eng_Latn', 'fra_Latn') == [['</s>', 'a']]
+    assert ctranslator.calls[-1] == {'target_prefix': [['fra_Latn']], **options}
+
+
+def ctranslate2_config(options):
+    return {
+        'languages': {'en': 'English', 'fr': 'French'},
+        'models': [{
+            'src': 'en',
+            'tgt': 'fr',
+            'model_type': 'ctranslator2',
+            'model_path': 'enfr',
+            'load': True,
+            'ctranslate2': options,
+            'pipeline': {'translate': True},
+        }],
+    }
+
+
+def test_invalid_ctranslate2_options():
+    for options, warning in [
+        ({'beam_size': 0}, 'beam_size: 0'),
+        ({'compute_type': 'int4'}, "compute_type: 'int4'"),
+        ({'batch_type': 'sentences'}, "batch_type: 'sentences'"),
+        ({'replace_unknowns': 'yes'}, "replace_unknowns: 'yes'"),
+        ({'inter_threads': True}, 'inter_threads: True'),
+        ({'num_hypotheses': 2}, 'num_hypotheses: 2'),
+    ]:
+        config = Config(config_data=ctranslate2_config(options))
+        assert not config.loaded_models
+        assert config.warnings == [f'Invalid `ctranslate2` option {warning} for model enfr. Skipping load']
+
+    config = Config(config_data=ctranslate2_config(['beam_size']))
+    assert config.warnings == ['`ctranslate2` options of model enfr must be an object. Skipping load']
+
+
+def test_batch_ctranslator_token_budget():
+    ctranslator = FakeCTranslator()
+    translator = get_batch_ctranslator(ctranslator, translate_options={'beam_size': 1}, batch_tokens=4)
+    src_texts = [['a'] * 5, ['b'], ['c', 'c'], ['d']]
+    assert translator(src_texts) == src_texts
+    # Bucketed by CTranslate2 itself, in a single call
+    assert ctranslator.calls == [{'beam_size': 1, 'max_batch_size': 4, 'batch_type': 'tokens'}]
+
+    # Batch options set in the model config take precedence
+    get_batch_ctranslator(ctranslator, translate_options={'max_batch_size': 32}, batch_tokens=4)([['a']])
+    assert ctranslator.calls[-1] == {'max_batch_size': 32}
+    get_batch_ctranslator(ctranslator, batch_tokens=0)([['a']])
+    assert ctranslator.calls[-1] == {}
+
+
+def test_pair_pipeline_cache():
+    built = []
+
+    def build_pipeline(src, tgt):
+        built.append((src, tgt))
+        return FakePipeline()
+
+    get_pair_pipeline = pair_pipeline_cache(build_pipeline, maxsize=2)
+    en_fr = get_pair_pipeline('eng_Latn', 'fra_Latn')
+    assert get_pair_pipeline('eng_Latn', 'fra_Latn') is en_fr
+    get_pair_pipeline('eng_Latn', 'deu_Latn')
+    assert built == [('eng_Latn', 'fra_Latn'), ('eng_Latn', 'deu_Latn')]
+
+    # A third pair evicts the least recently used one
+    get_pair_pipeline('eng_Latn', 'fra_Latn')
+    get_pair_pipeline('eng_Latn', 'swh_Latn')
+    get_pair_pipeline('eng_Latn', 'fra_Latn')
+    assert len(built) == 3
+    get_pair_pipeline('eng_Latn', 'deu_Latn')
+    assert built[-1] == ('eng_Latn', 'deu_Latn')
+    assert len(built) == 4
+
+    assert pair_pipeline_cache(build_pipeline).cache_info().maxsize == TRANSFORMERS_PIPELINE_CACHE_SIZE
@@ -1,4 +1,10 @@
-from app.utils.utils import get_model_id, parse_model_id
+from app.utils.utils import (
+    batch_processor,
+    capitalizer,
+    get_model_id,
+    length_sorted_batches,
+    parse_model_id,
+)
 
 
 def test_get_model_id():
@@ -10,3 +16,27 @@ def test_parse_model_id():
     assert parse_model_id('en') is None
     assert ('en', 'fr', '') == parse_model_id('en-fr')
     assert ('en', 'fr', 'xyz') == parse_model_id('en-fr-xyz')
+
+
+def test_length_sorted_batches():
+    lengths = [5, 1, 3, 9, 2]
+    batches = length_sorted_batches(lengths, 2)
+    assert batches == [[1, 4], [2, 0], [3]]
+    assert sorted(i for batch in batches for i in batch) == list(range(5))
+    assert length_sorted_batches([], 4) == []
+
+
+def test_length_sorted_batches_token_budget():
+    lengths = [2, 40, 3, 2, 25, 1, 30]
+    # Short items share a batch, long ones are decoded in smaller batches
+    assert length_sorted_batches(lengths, 8, max_tokens=60) == [[5, 0, 3, 2], [4, 6], [1]]
+    # An item longer than the budget gets a batch of its own
+    assert length_sorted_batches([100, 1], 8, max_tokens=60) == [[1], [0]]
+    assert length_sorted_batches(lengths, 3, max_tokens=60) == [[5, 0, 3], [2, 4], [6], [1]]
+
+
+def test_batch_processor():
+    process = batch_processor(capitalizer)
+    assert process.__name__ == 'capitalizer'
+    assert process(['hello there', 'HOW']) == ['Hello there', 'How']
+    assert process([]) == []
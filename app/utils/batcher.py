@@ -0,0 +1,242 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from app.constants import BULK_PRIORITY, INTERACTIVE_PRIORITY
+
+logger = logging.getLogger('console_logger')
+
+
+class _BatchItem:
+    __slots__ = ('sentences', 'src', 'tgt', 'future', 'num_tokens', 'queued_at')
+
+    def __init__(self, sentences: List, src: Optional[str], tgt: Optional[str]):
+        self.sentences = sentences
+        self.src = src
+        self.tgt = tgt
+        self.future: Future = Future()
+        self.num_tokens = sum(count_tokens(s) for s in sentences)
+        self.queued_at = time.monotonic()
+
+
+def count_tokens(sentence) -> int:
+    # Preprocessed sentences are either token lists or plain strings
+    if isinstance(sentence, (list, tuple)):
+        return len(sentence)
+    return len(sentence.split())
+
+
+class TranslationBatcher:
+    """
+    Micro-batching scheduler in front of a model translator. Sentences
+    submitted by concurrent callers are coalesced per (src, tgt) into a single
+    translator call and the results are handed back to each caller.
+
+    Requests are queued in two lanes, interactive and bulk. Interactive
+    batches are always served first, except that when bulk work is waiting
+    at least `bulk_min_share` of the batches go to the bulk lane. Requests
+    longer than `max_batch_sentences` are split so that interactive work can
+    run in between their parts.
+
+    Up to `max_in_flight` batches are translated at the same time, each on
+    its own worker thread, for translators that run several batches in
+    parallel (e.g. CTranslate2 with inter_threads > 1).
+
+    Callable with the same signature as the translators it wraps, plus an
+    optional `priority`. Once closed, e.g. when its model is unloaded, calls
+    go straight to the translator without starting a worker thread again.
+    """
+
+    def __init__(
+        self,
+        translator: Callable,
+        max_batch_sentences: int = 64,
+        max_batch_tokens: int = 0,
+        max_wait_ms: float = 0,
+        bulk_min_share: float = 0.2,
+        max_in_flight: int = 1,
+        name: str = '',
+    ):
+        self.translator = translator
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_batch_sentences = max_batch_sentences
+        self.max_batch_tokens = max_batch_tokens
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        # Number of interactive batches in a row after which a waiting
+        # bulk batch gets its turn
+        self.max_interactive_streak = (
+            math.ceil(1 / bulk_min_share) - 1 if bulk_min_share > 0 else math.inf
+        )
+
+        self._lanes: Dict[str, Deque[_BatchItem]] = {
+            INTERACTIVE_PRIORITY: deque(),
+            BULK_PRIORITY: deque(),
+        }
+        self._interactive_streak = 0
+        self._stopping = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def __call__(
+        self,
+        src_texts: List,
+        src: Optional[str] = None,
+        tgt: Optional[str] = None,
+        priority: str = INTERACTIVE_PRIORITY,
+    ) -> List:
+        if not src_texts:
+            return []
+        src_texts = list(src_texts)
+        step = self.max_batch_sentences or len(src_texts)
+        items = [
+            _BatchItem(src_texts[i:i + step], src, tgt)
+            for i in range(0, len(src_texts), step)
+        ]
+        lane = self._lanes[priority]
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._ensure_started()
+                with self._cond:
+                    lane.extend(items)
+                    self._cond.notify()
+        # Callers still holding the model of an unloaded batcher
+        if closed:
+            return self.translator(src_texts, src, tgt)
+
+        return [t for item in items for t in item.future.result()]
+
+    def qsize(self, priority: Optional[str] = None) -> int:
+        if priority is not None:
+            return len(self._lanes[priority])
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            if self._threads:
+                with self._cond:
+                    self._stopping = True
+                    self._cond.notify_all()
+                for thread in self._threads:
+                    thread.join()
+                self._threads = []
+
+    def _ensure_started(self) -> None:
+        # The worker threads are started on first use so that batchers
+        # created at load time don't spawn threads until the model is
+        # actually used. Called with self._lock held, which close() also
+        # holds until the workers have drained the lanes, so no item is left
+        # behind
+        if not self._threads:
+            self._threads = [
+                threading.Thread(
+                    target=self._run,
+                    name=f'batcher-{self.name}',
+                    daemon=True,
+                )
+                for _ in range(self.max_in_flight)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _is_full(self, num_sentences: int, num_tokens: int) -> bool:
+        if self.max_batch_sentences and num_sentences >= self.max_batch_sentences:
+            return True
+        if self.max_batch_tokens and num_tokens >= self.max_batch_tokens:
+            return True
+        return False
+
+    def _pick_lane(self) -> Deque[_BatchItem]:
+        # Called with self._cond held and at least one lane non-empty
+        interactive = self._lanes[INTERACTIVE_PRIORITY]
+        bulk = self._lanes[BULK_PRIORITY]
+        if not bulk:
+            return interactive
+        if interactive and self._interactive_streak < self.max_interactive_streak:
+            self._interactive_streak += 1
+            return interactive
+        self._interactive_streak = 0
+        return bulk
+
+    def _collect(self) -> Optional[List[_BatchItem]]:
+        with self._cond:
+            while not self.qsize():
+                if self._stopping:
+                    return None
+                self._cond.wait()
+
+            lane = self._pick_lane()
+            first = lane.popleft()
+            items = [first]
+            num_sentences = len(first.sentences)
+            num_tokens = first.num_tokens
+            deadline = time.monotonic() + self.max_wait
+
+            while not self._is_full(num_sentences, num_tokens):
+                if not lane:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0 or self._stopping:
+                        break
+                    # Don't hold back interactive work to fill a bulk batch
+                    if lane is not self._lanes[INTERACTIVE_PRIORITY] and self._lanes[INTERACTIVE_PRIORITY]:
+                        break
+                    self._cond.wait(timeout)
+                    continue
+                item = lane[0]
+                # Leave requests that would overflow the batch for the next round
+                if self._is_full(
+                    num_sentences + len(item.sentences) - 1,
+                    num_tokens + item.num_tokens - 1,
+                ):
+                    break
+                items.append(lane.popleft())
+                num_sentences += len(item.sentences)
+                num_tokens += item.num_tokens
+
+        return items
+
+    def _run(self) -> None:
+        while True:
+            items = self._collect()
+            if items is None:
+                return
+
+            groups: Dict[Tuple, List[_BatchItem]] = {}
+            for item in items:
+                groups.setdefault((item.src, item.tgt), []).append(item)
+
+            for (src, tgt), group in groups.items():
+                self._translate_group(group, src, tgt)
+
+    def _translate_group(self, group: List[_BatchItem], src: Optional[str], tgt: Optional[str]) -> None:
+        # Imported here, the metrics module depends on the model config
+        from app.utils import metrics
+
+        batch = [s for item in group for s in item.sentences]
+        # Time waiting in the lanes and time in the translator are reported
+        # as separate stages
+        started_at = time.monotonic()
+        for item in group:
+            metrics.observe_stage(self.name, src, tgt, 'queue', started_at - item.queued_at)
+        try:
+            with metrics.stage_timer(self.name, src, tgt, 'translate'):
+                translations = self.translator(batch, src, tgt)
+        except Exception as e:
+            logger.exception(f'Batched translation failed for {self.name}')
+            for item in group:
+                item.future.set_exception(e)
+            return
+
+        start = 0
+        for item in group:
+            end = start + len(item.sentences)
+            item.future.set_result(translations[start:end])
+            start = end
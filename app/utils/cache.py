@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from app.settings import (
+    TRANSLATION_CACHE_MAX_BYTES,
+    TRANSLATION_CACHE_SIZE,
+    TRANSLATION_CACHE_TTL,
+)
+
+
+def _sizeof(item: Any) -> int:
+    # Approximate size of a cached sentence (string or token list) in bytes
+    if isinstance(item, str):
+        return len(item.encode('utf-8'))
+    if isinstance(item, (list, tuple)):
+        return sum(_sizeof(i) for i in item)
+    return 0
+
+
+def sentence_key(sentence: Any) -> Hashable:
+    # Preprocessed sentences can be token lists, which aren't hashable
+    if isinstance(sentence, list):
+        return tuple(sentence)
+    return sentence
+
+
+class TranslationCache:
+    """
+    Thread-safe LRU cache of translator outputs. Keys are
+    (model_id, src, tgt, preprocessed sentence) tuples; the alt tag is part
+    of the model id.
+
+    Entries are evicted least recently used first when there are more than
+    `max_entries` entries or, if `max_bytes` is set, when their approximate
+    total size goes over it. Entries older than `ttl` seconds (if set) are
+    treated as misses.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int = 0, ttl: float = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._entries: 'OrderedDict[Tuple, Tuple[Any, int, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple) -> Tuple[bool, Optional[Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, size, created = entry
+                if self.ttl and time.monotonic() - created > self.ttl:
+                    self._remove(key)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+            self.misses += 1
+            return False, None
+
+    def put(self, key: Tuple, value: Any) -> None:
+        size = _sizeof(key[-1]) + _sizeof(value)
+        if self.max_bytes and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes and self._bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, model_id: Optional[str] = None) -> None:
+        with self._lock:
+            if model_id is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            for key in [k for k in self._entries if k[0] == model_id]:
+                self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def _remove(self, key: Tuple) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+translation_cache = TranslationCache(
+    TRANSLATION_CACHE_SIZE, TRANSLATION_CACHE_MAX_BYTES, TRANSLATION_CACHE_TTL
+)
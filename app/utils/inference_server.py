@@ -0,0 +1,269 @@
+import logging
+import os
+import stat
+import threading
+from multiprocessing.connection import Client, Connection, Listener
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, List, Optional, Tuple, Union
+
+from app.constants import INTERACTIVE_PRIORITY
+from app.exceptions import ConfigurationException, InferenceServerException, ModelLoadingException
+from app.settings import (
+    INFERENCE_SERVER_ADDRESS,
+    INFERENCE_SERVER_AUTHKEY,
+    INFERENCE_SHM_MIN_SENTENCES,
+)
+from app.utils.shared_batches import (
+    SharedBatch,
+    SharedBatchBuffer,
+    attach_shared_memory,
+    encode_batch,
+    read_batch,
+    write_batch,
+)
+
+logger = logging.getLogger('console_logger')
+
+Address = Union[str, Tuple[str, int]]
+
+# Reply statuses
+OK = 'ok'
+LOADING = 'loading'
+ERROR = 'error'
+
+# Initial size of the shared memory buffer of each client connection
+SHARED_BUFFER_SIZE = 1 << 20
+
+
+def parse_address(address: str) -> Address:
+    # host:port for TCP, anything else is a unix socket path
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit() and '/' not in address:
+        return host, int(port)
+    return address
+
+
+def check_authkey(authkey: bytes) -> None:
+    # Connections exchange pickles, so anyone able to connect without
+    # knowing the key could run code in the server
+    if not authkey:
+        raise ConfigurationException('Set MT_API_INFERENCE_AUTHKEY to use an inference server')
+
+
+class InferenceClient:
+    """
+    Connection pool to the inference server at `address`. Each call takes a
+    connection from the pool (or opens one), so concurrent callers in a
+    worker never share a connection.
+
+    Batches of at least `shm_min_sentences` sentences are passed through a
+    shared memory buffer of the connection, in both directions, in the
+    compact encoding of encode_batch instead of as pickles sent through the
+    socket. Only for unix sockets, where the server is on the same host.
+    """
+
+    def __init__(self, address: str, authkey: bytes, shm_min_sentences: int = 0):
+        if address:
+            check_authkey(authkey)
+        self.address = address
+        self.authkey = authkey
+        self.shm_min_sentences = (
+            shm_min_sentences if isinstance(parse_address(address), str) else 0
+        )
+        # Turned off in the inference server process itself, which loads the
+        # translators from the same config
+        self.enabled = bool(address)
+        self._channels: List[Tuple[Connection, Optional[SharedBatchBuffer]]] = []
+        self._lock = threading.Lock()
+
+    def translate(
+        self, model_id: str, src_texts: List, src: Optional[str], tgt: Optional[str], priority: str
+    ) -> List:
+        connection, buffer = self._acquire()
+        try:
+            use_shm = self.shm_min_sentences and len(src_texts) >= self.shm_min_sentences
+            batch = buffer.write(src_texts) if use_shm else src_texts
+            connection.send(('translate', model_id, batch, src, tgt, priority))
+            status, payload = connection.recv()
+            if isinstance(payload, SharedBatch):
+                payload = buffer.read(payload)
+        except (OSError, EOFError) as e:
+            self._discard(connection, buffer)
+            logger.warning('Inference server at %s unavailable: %s', self.address, e)
+            raise ModelLoadingException('Inference server unavailable')
+
+        with self._lock:
+            self._channels.append((connection, buffer))
+
+        if status == OK:
+            return payload
+        if status == LOADING:
+            raise ModelLoadingException(payload)
+        raise InferenceServerException(payload)
+
+    def close(self) -> None:
+        with self._lock:
+            channels, self._channels = self._channels, []
+        for connection, buffer in channels:
+            self._discard(connection, buffer)
+
+    def _acquire(self) -> Tuple[Connection, Optional[SharedBatchBuffer]]:
+        with self._lock:
+            if self._channels:
+                return self._channels.pop()
+        try:
+            connection = Client(parse_address(self.address), authkey=self.authkey)
+        except OSError as e:
+            logger.warning('Inference server at %s unavailable: %s', self.address, e)
+            raise ModelLoadingException('Inference server unavailable')
+        return connection, SharedBatchBuffer(SHARED_BUFFER_SIZE) if self.shm_min_sentences else None
+
+    def _discard(self, connection: Connection, buffer: Optional[SharedBatchBuffer]) -> None:
+        connection.close()
+        if buffer:
+            buffer.close()
+
+
+class RemoteTranslator:
+    """
+    Translator of a model loaded by the inference server. Callable like the
+    local translators, plus the request priority, which the server's batcher
+    schedules by.
+    """
+
+    def __init__(self, client: InferenceClient, model_id: str):
+        self.client = client
+        self.model_id = model_id
+
+    def __call__(
+        self,
+        src_texts: List,
+        src: Optional[str] = None,
+        tgt: Optional[str] = None,
+        priority: str = INTERACTIVE_PRIORITY,
+    ) -> List:
+        if not src_texts:
+            return []
+        return self.client.translate(self.model_id, list(src_texts), src, tgt, priority)
+
+
+class InferenceServer:
+    """
+    Loads the models of the config once and serves their translators to the
+    API worker processes over `multiprocessing.connection`, so that N uvicorn
+    workers share a single copy of the model weights. Requests from all
+    workers go through each model's batcher.
+    """
+
+    def __init__(self, address: str, authkey: bytes):
+        check_authkey(authkey)
+        self.address = address
+        self.authkey = authkey
+        self._listener: Optional[Listener] = None
+
+    def serve_forever(self, load_models: bool = True, background_load: bool = False) -> None:
+        from app.helpers.config import Config
+
+        inference_client.enabled = False
+        if load_models:
+            Config(load_all_models=True, background_load=background_load)
+
+        if self._listener is None:
+            self.start()
+        # close() from another thread resets self._listener
+        listener = self._listener
+        logger.info('Inference server listening on %s', self.address)
+        try:
+            while True:
+                try:
+                    connection = listener.accept()
+                except OSError:
+                    # Listener closed
+                    return
+                threading.Thread(
+                    target=self._serve_connection,
+                    args=(connection,),
+                    name='inference-server-connection',
+                    daemon=True,
+                ).start()
+        finally:
+            self.close()
+
+    def start(self) -> None:
+        address = parse_address(self.address)
+        # Remove the socket file left by a previous server that didn't exit cleanly
+        if isinstance(address, str) and os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode):
+            os.unlink(address)
+        if not isinstance(address, str):
+            self._listener = Listener(address, authkey=self.authkey)
+            return
+        # Only the user running the server and the workers can connect to the
+        # socket. The umask covers the window between bind and chmod
+        umask = os.umask(0o177)
+        try:
+            self._listener = Listener(address, authkey=self.authkey)
+        finally:
+            os.umask(umask)
+        os.chmod(address, 0o600)
+
+    def close(self) -> None:
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    def _serve_connection(self, connection: Connection) -> None:
+        # Shared memory buffer of the client at the other end, if any
+        shm: Optional[SharedMemory] = None
+        with connection:
+            try:
+                while True:
+                    command, *args = connection.recv()
+                    reply_shm = None
+                    if command == 'translate' and isinstance(args[1], SharedBatch):
+                        ref = args[1]
+                        # The client replaces its buffer when it needs a larger one
+                        if shm is None or shm.name != ref.name:
+                            if shm is not None:
+                                shm.close()
+                            shm = attach_shared_memory(ref.name)
+                        args[1] = read_batch(shm, ref)
+                        reply_shm = shm
+                    connection.send(self._handle((command, *args), reply_shm))
+            except (OSError, EOFError):
+                # Worker disconnected
+                return
+            finally:
+                if shm is not None:
+                    shm.close()
+
+    def _handle(self, request: Tuple, shm: Optional[SharedMemory] = None) -> Tuple[str, Any]:
+        from app.helpers.config import Config
+        from app.utils.translate import get_translator
+
+        command, *args = request
+        if command != 'translate':
+            return ERROR, f'Unknown command {command}'
+
+        model_id, src_texts, src, tgt, priority = args
+        try:
+            model = Config().get_model(model_id)
+        except ModelLoadingException as e:
+            return LOADING, str(e) or f'Model {model_id} could not be loaded'
+        except KeyError:
+            return ERROR, f'Model {model_id} not found on the inference server'
+
+        try:
+            translations = get_translator(model, priority)(src_texts, src, tgt)
+        except Exception as e:
+            logger.exception('Inference server failed to translate with %s', model_id)
+            return ERROR, f'{e.__class__.__name__}: {e}'
+
+        # Write the translations back to the client's buffer when they fit
+        if shm is not None:
+            ref = write_batch(shm, encode_batch(translations))
+            if ref:
+                return OK, ref
+        return OK, translations
+
+
+inference_client = InferenceClient(INFERENCE_SERVER_ADDRESS, INFERENCE_SERVER_AUTHKEY, INFERENCE_SHM_MIN_SENTENCES)
@@ -0,0 +1,276 @@
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set
+
+from app.constants import BULK_PRIORITY
+from app.exceptions import ModelLoadingException
+from app.helpers.config import Config
+from app.settings import JOB_CHUNK_SIZE, JOB_WORKERS, JOBS_DIR
+from app.utils.translate import translate_texts
+
+logger = logging.getLogger('console_logger')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+UNFINISHED_STATUSES = (QUEUED, RUNNING)
+
+_JOB_ID = re.compile('[0-9a-f]{32}')
+
+# Seconds between retries of a chunk whose model is still loading at startup
+_MODEL_LOADING_RETRY_DELAY = 1
+
+
+def _write_json(path: str, data) -> None:
+    # Write to a temporary file first so that a crash never leaves a
+    # truncated file behind
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _create_marker(path: str, content: str) -> None:
+    # Only the first of concurrent writers creates the file, so the first
+    # cancellation or error of a job is the one kept
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        return
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+class JobManager:
+    """
+    Runs large translation jobs in the background. Each job's texts are split
+    into chunks of `chunk_size` that go through the regular batched
+    translation path at bulk priority on a pool of `max_workers` threads,
+    separate from the request inference pool.
+
+    Everything is persisted under `jobs_dir/<job_id>/`: the job description
+    (job.json), its input (input.json) and the result of every finished chunk
+    (chunks/<n>.json). The state of a job is read from these files, so any
+    API worker process sharing jobs_dir can report on a job submitted to
+    another one. Unfinished jobs are picked up again by resume(), only
+    translating the chunks that have no result yet. A chunk is run under an
+    exclusive lock on chunks/<n>.lock, so that when several workers resume
+    the same jobs each chunk is translated by only one of them.
+    """
+
+    def __init__(self, jobs_dir: Optional[str], chunk_size: int = 64, max_workers: int = 2):
+        self.jobs_dir = jobs_dir
+        self.chunk_size = max(1, chunk_size)
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: Set[Future] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.jobs_dir)
+
+    def submit(self, model_id: str, texts: List[str], src: str, tgt: str) -> Dict:
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'model_id': model_id,
+            'src': src,
+            'tgt': tgt,
+            'num_texts': len(texts),
+            'total_chunks': (len(texts) + self.chunk_size - 1) // self.chunk_size,
+            'chunk_size': self.chunk_size,
+            'created': time.time(),
+        }
+        os.makedirs(self._chunks_dir(job_id))
+        _write_json(self._input_path(job_id), texts)
+        # Written last: a job directory without job.json isn't a job yet
+        _write_json(self._job_path(job_id), job)
+
+        self._schedule(job, texts, range(job['total_chunks']))
+        return self.status(job_id)
+
+    def status(self, job_id: str) -> Dict:
+        job = self._load(job_id)
+        return {k: job[k] for k in (
+            'job_id', 'status', 'num_texts', 'total_chunks', 'completed_chunks', 'error'
+        )}
+
+    def results(self, job_id: str) -> Optional[List[str]]:
+        """Translations of a completed job, None while it is unfinished"""
+        job = self._load(job_id)
+        if job['status'] != COMPLETED:
+            return None
+
+        translations: List[str] = []
+        for chunk in range(job['total_chunks']):
+            translations.extend(_read_json(self._chunk_path(job_id, chunk)))
+        return translations
+
+    def cancel(self, job_id: str) -> Dict:
+        if self._load(job_id)['status'] in UNFINISHED_STATUSES:
+            _create_marker(self._cancelled_path(job_id), '')
+        return self.status(job_id)
+
+    def resume(self) -> None:
+        """Restarts the unfinished jobs found in jobs_dir"""
+        if not self.enabled or not os.path.isdir(self.jobs_dir):
+            return
+
+        for job_id in sorted(os.listdir(self.jobs_dir)):
+            try:
+                job = self._load(job_id)
+            except KeyError:
+                continue
+            except (OSError, ValueError):
+                logger.warning(f'Skipping unreadable job {job_id}')
+                continue
+            if job['status'] not in UNFINISHED_STATUSES:
+                continue
+
+            pending = [
+                chunk for chunk in range(job['total_chunks'])
+                if not os.path.isfile(self._chunk_path(job_id, chunk))
+            ]
+            logger.info(f'Resuming job {job_id}: {len(pending)} of {job["total_chunks"]} chunks left')
+            self._schedule(job, _read_json(self._input_path(job_id)), pending)
+
+    def shutdown(self) -> None:
+        # Chunks still queued stay without results on disk and are
+        # picked up by resume() on the next start
+        with self._lock:
+            executor, self._executor = self._executor, None
+            futures = list(self._futures)
+        if executor is not None:
+            # ThreadPoolExecutor.shutdown(cancel_futures=True) needs Python 3.9.
+            # Cancelled outside the lock, which their done callbacks take
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _schedule(self, job: Dict, texts: List[str], chunks) -> None:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='job',
+                )
+            executor = self._executor
+
+        chunk_size = job['chunk_size']
+        for chunk in chunks:
+            chunk_texts = texts[chunk * chunk_size:(chunk + 1) * chunk_size]
+            future = executor.submit(self._run_chunk, job, chunk, chunk_texts)
+            with self._lock:
+                self._futures.add(future)
+            future.add_done_callback(self._forget)
+
+    def _forget(self, future: Future) -> None:
+        with self._lock:
+            self._futures.discard(future)
+
+    def _run_chunk(self, job: Dict, chunk: int, texts: List[str]) -> None:
+        job_id = job['job_id']
+        with self._claim_chunk(job_id, chunk) as claimed:
+            # Translated by another worker, or the job was cancelled or failed
+            if not claimed or self._load(job_id)['status'] not in UNFINISHED_STATUSES:
+                return
+            try:
+                translations = self._translate(job, texts)
+                _write_json(self._chunk_path(job_id, chunk), translations)
+            except Exception as e:
+                logger.exception(f'Job {job_id} failed on chunk {chunk}')
+                _create_marker(self._error_path(job_id), str(e) or e.__class__.__name__)
+
+    @contextmanager
+    def _claim_chunk(self, job_id: str, chunk: int) -> Iterator[bool]:
+        # The lock is released when the file is closed, also when the
+        # process dies, so chunks of a crashed worker can be claimed again
+        lock_path = os.path.join(self._chunks_dir(job_id), f'{chunk}.lock')
+        fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            # Checked under the lock, the chunk may have been finished by
+            # the worker that held it before
+            yield not os.path.isfile(self._chunk_path(job_id, chunk))
+            # Workers that open the file from now on find the result above
+            os.unlink(lock_path)
+        finally:
+            os.close(fd)
+
+    def _translate(self, job: Dict, texts: List[str]) -> List[str]:
+        while True:
+            try:
+                return translate_texts(
+                    job['model_id'], texts, job['src'], job['tgt'], BULK_PRIORITY
+                )
+            except ModelLoadingException:
+                # Jobs resumed at startup can run before their model is
+                # loaded in the background
+                if Config().ready:
+                    raise
+                time.sleep(_MODEL_LOADING_RETRY_DELAY)
+
+    def _load(self, job_id: str) -> Dict:
+        """Job description with its current state. KeyError for unknown jobs"""
+        if not _JOB_ID.fullmatch(job_id) or not os.path.isfile(self._job_path(job_id)):
+            raise KeyError(job_id)
+        job = _read_json(self._job_path(job_id))
+
+        chunk_files = set(os.listdir(self._chunks_dir(job_id)))
+        job['completed_chunks'] = sum(f'{chunk}.json' in chunk_files for chunk in range(job['total_chunks']))
+        job['error'] = None
+        if os.path.isfile(self._cancelled_path(job_id)):
+            job['status'] = CANCELLED
+        elif os.path.isfile(self._error_path(job_id)):
+            job['status'] = FAILED
+            with open(self._error_path(job_id), 'r', encoding='utf-8') as f:
+                job['error'] = f.read()
+        elif job['completed_chunks'] == job['total_chunks']:
+            job['status'] = COMPLETED
+        elif job['completed_chunks'] or any(f.endswith('.lock') for f in chunk_files):
+            job['status'] = RUNNING
+        else:
+            job['status'] = QUEUED
+        return job
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id, 'job.json')
+
+    def _input_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id, 'input.json')
+
+    def _cancelled_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id, 'cancelled')
+
+    def _error_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id, 'error')
+
+    def _chunks_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id, 'chunks')
+
+    def _chunk_path(self, job_id: str, chunk: int) -> str:
+        return os.path.join(self._chunks_dir(job_id), f'{chunk}.json')
+
+
+job_manager = JobManager(JOBS_DIR, JOB_CHUNK_SIZE, JOB_WORKERS)
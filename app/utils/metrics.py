@@ -0,0 +1,118 @@
+from typing import ContextManager, List
+
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from app.constants import BULK_PRIORITY, INTERACTIVE_PRIORITY
+from app.helpers.config import Config
+from app.helpers.executor import inference_executors
+from app.utils.batcher import count_tokens
+from app.utils.cache import translation_cache
+
+PAIR_LABELS = ['model_id', 'src', 'tgt']
+
+REQUESTS = Counter(
+    'mt_api_requests', 'Translation requests', ['endpoint'] + PAIR_LABELS
+)
+SENTENCES = Counter(
+    'mt_api_sentences', 'Sentences translated', PAIR_LABELS
+)
+CHARACTERS_IN = Counter(
+    'mt_api_characters_in', 'Characters of the source sentences', PAIR_LABELS
+)
+CHARACTERS_OUT = Counter(
+    'mt_api_characters_out', 'Characters of the translated sentences', PAIR_LABELS
+)
+TOKENS_IN = Counter(
+    'mt_api_tokens_in', 'Preprocessed tokens sent to the translator', PAIR_LABELS
+)
+TOKENS_OUT = Counter(
+    'mt_api_tokens_out', 'Tokens returned by the translator', PAIR_LABELS
+)
+STAGE_SECONDS = Histogram(
+    'mt_api_stage_seconds',
+    'Time spent in each stage of the translation pipeline',
+    PAIR_LABELS + ['stage'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+)
+
+
+def stage_timer(model_id: str, src: str, tgt: str, stage: str) -> ContextManager:
+    return STAGE_SECONDS.labels(model_id, src, tgt, stage).time()
+
+
+def observe_stage(model_id: str, src: str, tgt: str, stage: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(model_id, src, tgt, stage).observe(seconds)
+
+
+def processor_stage(kind: str, processor) -> str:
+    # e.g. preprocess:moses_tokenizer
+    return f'{kind}:{getattr(processor, "__name__", type(processor).__name__)}'
+
+
+def count_request(endpoint: str, model_id: str, src: str, tgt: str) -> None:
+    REQUESTS.labels(endpoint, model_id, src, tgt).inc()
+
+
+def count_sentences(
+    model_id: str, src: str, tgt: str, sources: List[str], translations: List[str]
+) -> None:
+    SENTENCES.labels(model_id, src, tgt).inc(len(sources))
+    CHARACTERS_IN.labels(model_id, src, tgt).inc(sum(len(s) for s in sources))
+    CHARACTERS_OUT.labels(model_id, src, tgt).inc(sum(len(t) for t in translations))
+
+
+def count_translator_tokens(
+    model_id: str, src: str, tgt: str, sentences: List, translations: List
+) -> None:
+    TOKENS_IN.labels(model_id, src, tgt).inc(sum(count_tokens(s) for s in sentences))
+    TOKENS_OUT.labels(model_id, src, tgt).inc(sum(count_tokens(t) for t in translations))
+
+
+class RuntimeCollector:
+    """Reports queue depths and cache statistics when metrics are scraped"""
+
+    def describe(self):
+        # Without describe() the registry would call collect() on
+        # registration, before the models are configured
+        return []
+
+    def collect(self):
+        batch_queue = GaugeMetricFamily(
+            'mt_api_batch_queue_depth',
+            'Requests waiting in the batching queue of each model',
+            labels=['model_id', 'priority'],
+        )
+        for model_id, model in list(Config().loaded_models.items()):
+            if model['batcher']:
+                for priority in (INTERACTIVE_PRIORITY, BULK_PRIORITY):
+                    batch_queue.add_metric(
+                        [model_id, priority], model['batcher'].qsize(priority)
+                    )
+        yield batch_queue
+
+        inference_queue = GaugeMetricFamily(
+            'mt_api_inference_pending',
+            'Requests running or waiting in the inference worker pools',
+            labels=['priority'],
+        )
+        for priority, executor in inference_executors.items():
+            inference_queue.add_metric([priority], executor.pending)
+        yield inference_queue
+
+        stats = translation_cache.stats()
+        yield CounterMetricFamily(
+            'mt_api_cache_hits', 'Translation cache hits', value=stats['hits']
+        )
+        yield CounterMetricFamily(
+            'mt_api_cache_misses', 'Translation cache misses', value=stats['misses']
+        )
+        yield GaugeMetricFamily(
+            'mt_api_cache_hit_rate', 'Translation cache hit rate', value=stats['hit_rate']
+        )
+        yield GaugeMetricFamily(
+            'mt_api_cache_entries', 'Translation cache entries', value=stats['entries']
+        )
+
+
+REGISTRY.register(RuntimeCollector())
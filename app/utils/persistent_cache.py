@@ -0,0 +1,149 @@
+import csv
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.settings import TRANSLATION_STORE_DIR
+
+logger = logging.getLogger('console_logger')
+
+STORE_FILENAME = 'translations.sqlite3'
+
+# SQLite limits the number of host parameters in a statement
+_QUERY_CHUNK_SIZE = 500
+
+
+class PersistentTranslationStore:
+    """
+    Sentence-level translation memory kept in an SQLite database under
+    `store_dir`. It maps (model_id, src, tgt, source sentence) to the final
+    translated sentence, so it survives restarts and is shared by every
+    worker process pointed at the same directory.
+
+    Each model id's fingerprint (see `check_model`) is kept next to its
+    translations, so that they are dropped once the model changes.
+
+    The database runs in WAL mode, which allows concurrent readers alongside
+    a writer from several processes. Each thread gets its own connection.
+    """
+
+    def __init__(self, store_dir: Optional[str]):
+        self.path: Optional[str] = (
+            os.path.join(store_dir, STORE_FILENAME) if store_dir else None
+        )
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def get_many(
+        self, model_id: str, src: str, tgt: str, sentences: Iterable[str]
+    ) -> Dict[str, str]:
+        sentences = list(set(sentences))
+        found: Dict[str, str] = {}
+        connection = self._connection()
+        for i in range(0, len(sentences), _QUERY_CHUNK_SIZE):
+            chunk = sentences[i:i + _QUERY_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            rows = connection.execute(
+                'SELECT source, target FROM translations '
+                'WHERE model_id = ? AND src = ? AND tgt = ? '
+                f'AND source IN ({placeholders})',
+                (model_id, src, tgt, *chunk),
+            )
+            found.update(rows)
+        return found
+
+    def put_many(
+        self, model_id: str, src: str, tgt: str, pairs: Iterable[Tuple[str, str]]
+    ) -> None:
+        self.put_rows((model_id, src, tgt, source, target) for source, target in pairs)
+
+    def put_rows(self, rows: Iterable[Tuple[str, str, str, str, str]]) -> None:
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO translations '
+                '(model_id, src, tgt, source, target) VALUES (?, ?, ?, ?, ?)',
+                rows,
+            )
+
+    def invalidate(self, model_id: Optional[str] = None) -> None:
+        connection = self._connection()
+        with connection:
+            if model_id is None:
+                connection.execute('DELETE FROM translations')
+            else:
+                connection.execute(
+                    'DELETE FROM translations WHERE model_id = ?', (model_id,)
+                )
+
+    def check_model(self, model_id: str, fingerprint: str) -> bool:
+        """
+        Records the fingerprint of the model loaded under model_id. When a
+        different fingerprint was recorded before, the model's config or
+        files changed and its stored translations are deleted. Returns
+        whether they were.
+        """
+        connection = self._connection()
+        with connection:
+            row = connection.execute(
+                'SELECT fingerprint FROM models WHERE model_id = ?', (model_id,)
+            ).fetchone()
+            changed = row is not None and row[0] != fingerprint
+            if changed:
+                connection.execute(
+                    'DELETE FROM translations WHERE model_id = ?', (model_id,)
+                )
+            connection.execute(
+                'INSERT OR REPLACE INTO models (model_id, fingerprint) VALUES (?, ?)',
+                (model_id, fingerprint),
+            )
+        return changed
+
+    def prewarm_from_tsv(self, tsv_path: str) -> int:
+        """
+        Loads known translations from a TSV file with the columns
+        model_id, src, tgt, source sentence and target sentence.
+        Returns the number of rows stored.
+        """
+        rows: List[Tuple[str, str, str, str, str]] = []
+        with open(tsv_path, 'r', encoding='utf-8', newline='') as tsv_file:
+            reader = csv.reader(tsv_file, delimiter='\t', quoting=csv.QUOTE_NONE)
+            for line_number, row in enumerate(reader, start=1):
+                if len(row) != 5:
+                    logger.warning(
+                        f'Skipping line {line_number} of {tsv_path}: '
+                        f'expected 5 columns, found {len(row)}'
+                    )
+                    continue
+                rows.append(tuple(row))
+        self.put_rows(rows)
+        logger.info(f'Prewarmed translation store with {len(rows)} translations from {tsv_path}')
+        return len(rows)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS translations ('
+                'model_id TEXT NOT NULL, src TEXT NOT NULL, tgt TEXT NOT NULL, '
+                'source TEXT NOT NULL, target TEXT NOT NULL, '
+                'PRIMARY KEY (model_id, src, tgt, source))'
+            )
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS models ('
+                'model_id TEXT PRIMARY KEY, fingerprint TEXT NOT NULL)'
+            )
+            self._local.connection = connection
+        return connection
+
+
+translation_store = PersistentTranslationStore(TRANSLATION_STORE_DIR)
@@ -1,13 +1,20 @@
+import json
 import os
-from typing import Dict, List, Callable, Callable
+from typing import Any, Dict, Hashable, List, Callable
 
 from app.exceptions import ModelLoadingException
+from app.helpers.resources import resource_registry
 from app.utils.segmenters import (
     desegmenter,
     get_bpe_segmenter,
-    get_sentencepiece_desegmenter,
-    get_sentencepiece_segmenter,
-    nltk_sentence_segmenter,
+    get_long_segment_splitter,
+    get_sentencepiece_batch_desegmenter,
+    get_sentencepiece_batch_segmenter,
+    load_bpe,
+    load_sentencepiece,
+    get_nltk_sentence_segmenter,
+    load_punkt,
+    punkt_language,
     token_desegmenter,
     token_segmenter,
 )
@@ -18,6 +25,7 @@ from app.utils.tokenizers import (
 )
 from app.utils.translators import (
     get_batch_ctranslator,
+    load_ctranslator,
     get_batch_opustranslator,
     get_batch_opusbigtranslator,
     get_batch_nllbtranslator,
@@ -26,25 +34,77 @@ from app.utils.translators import (
     get_custom_translator,
 )
 from app.utils.utils import (
+    batch_processor,
     capitalizer,
     lowercaser,
 )
+from app.utils.batcher import TranslationBatcher
+from app.utils.inference_server import RemoteTranslator, inference_client
+
+from app.settings import (
+    BATCHING_ENABLED,
+    BATCH_MAX_SENTENCES,
+    BATCH_MAX_TOKENS,
+    BATCH_MAX_WAIT_MS,
+    BATCH_BULK_MIN_SHARE,
+    CTRANSLATE_DEVICE,
+    CTRANSLATE_INTER_THREADS,
+    TRANSFORMERS_DEVICE,
+    DEFAULT_NLLB_MODEL_TYPE,
+    DEFAULT_M2M100_MODEL_TYPE,
+    TRANSFORMERS_BATCH_SIZE,
+    DECODE_BATCH_TOKENS,
+)
+from app.constants import (
+    CTRANSLATE2_TRANSLATE_OPTIONS,
+    INFERENCE_SERVER_MODEL_TYPES,
+    M2M100_CHECKPOINT_IDS,
+    NLLB_CHECKPOINT_IDS,
+)
+
+def acquire_resource(model: Dict, key: Hashable, factory: Callable[[], Any]) -> Any:
+    # Share objects loaded from the same files with the same settings between
+    # models. The model keeps the keys to release them when it is unloaded
+    resource = resource_registry.acquire(key, factory)
+    if resource is not None:
+        model['resources'].append(key)
+    return resource
+
+
+def _load_bpe_or_none(model_file: str):
+    try:
+        return load_bpe(model_file)
+    except Exception:
+        return None
 
-from app.settings import DEFAULT_NLLB_MODEL_TYPE, DEFAULT_M2M100_MODEL_TYPE
-from app.constants import NLLB_CHECKPOINT_IDS, M2M100_CHECKPOINT_IDS
 
 def load_model_sentence_segmenter(
     model: Dict,
     model_config: Dict,
+    model_id: str,
     pipeline_msg: List[str],
+    warn: Callable,
     *args,
     **kwargs,
 ) -> None:
     if 'sentence_split' in model_config:
         ss = model_config['sentence_split']
         if ss == 'nltk':
+            # The Punkt model of the source language is loaded once and
+            # shared by all the models with that source language
+            language = punkt_language(model['src'])
+            try:
+                punkt = acquire_resource(
+                    model, ('punkt', language), lambda: load_punkt(language)
+                )
+            except LookupError:
+                warn(
+                    f'Failed to load nltk sentence splitter for {model_id}: '
+                    'punkt data not found. Skipping load.'
+                )
+                raise ModelLoadingException
             pipeline_msg.append('sentence_split-nltk')
-            model['sentence_segmenter'] = nltk_sentence_segmenter
+            model['sentence_segmenter'] = get_nltk_sentence_segmenter(punkt)
         elif isinstance(ss, list):
             pipeline_msg.append('sentence_split-custom')
             model['sentence_segmenter'] = get_custom_tokenizer(ss)
@@ -61,7 +121,7 @@ def load_model_lowercaser(
         'lowercase' in model_config['pipeline']
         and model_config['pipeline']['lowercase']
     ):
-        model['preprocessors'].append(lowercaser)
+        model['preprocessors'].append(batch_processor(lowercaser))
         pipeline_msg.append('lowercase')
 
 
@@ -77,7 +137,7 @@ def load_model_tokenizer(
         and model_config['pipeline']['tokenize']
     ):
         tokenizer = get_moses_tokenizer(model_config['src'])
-        model['preprocessors'].append(tokenizer)
+        model['preprocessors'].append(batch_processor(tokenizer))
         pipeline_msg.append('mtokenize')
 
 
@@ -113,15 +173,17 @@ def load_model_segmenter(
             )
             raise ModelLoadingException
 
-        bpe_segmenter = get_bpe_segmenter(model_file)
+        bpe = acquire_resource(
+            model, ('bpe', model_file), lambda: _load_bpe_or_none(model_file)
+        )
 
-        if not bpe_segmenter:
+        if not bpe:
             warn(
                 f'Failed to loading bpe model {model_file} for {model_id}. Skipping load.'
             )
             raise ModelLoadingException
 
-        model['preprocessors'].append(bpe_segmenter)
+        model['preprocessors'].append(batch_processor(get_bpe_segmenter(bpe)))
         checks['bpe_ok'] = True
         pipeline_msg.append('bpe')
     elif (
@@ -153,12 +215,28 @@ def load_model_segmenter(
             )
             raise ModelLoadingException
 
-        model['preprocessors'].append(get_sentencepiece_segmenter(model_file))
+        sp = acquire_resource(
+            model, ('sentencepiece', model_file), lambda: load_sentencepiece(model_file)
+        )
+        model['preprocessors'].append(get_sentencepiece_batch_segmenter(sp))
         checks['sentencepiece_ok'] = True
         pipeline_msg.append('sentencepiece')
     elif model_config['model_type'] == 'ctranslator2':
         # default tokenizer needed for ctranslator2 translation
-        model['preprocessors'].append(token_segmenter)
+        model['preprocessors'].append(batch_processor(token_segmenter))
+
+
+def load_model_source_splitter(
+    model: Dict,
+    model_config: Dict,
+    pipeline_msg: List[str],
+    *args,
+    **kwargs,
+) -> None:
+    max_source_tokens = model_config.get('max_source_tokens')
+    if max_source_tokens:
+        model['source_splitter'] = get_long_segment_splitter(max_source_tokens)
+        pipeline_msg.append(f'split-{max_source_tokens}')
 
 
 def load_model_translator(
@@ -176,7 +254,13 @@ def load_model_translator(
         and model_config['pipeline']['translate']
     ):
         msg = 'translate'
-        if model_config['model_type'] == 'ctranslator2':
+        batch_size = model_config.get('batch_size', TRANSFORMERS_BATCH_SIZE)
+        batch_tokens = model_config.get('batch_tokens', DECODE_BATCH_TOKENS)
+        if inference_client.enabled and model_config['model_type'] in INFERENCE_SERVER_MODEL_TYPES:
+            # The model weights are loaded once by the inference server
+            model['translator'] = RemoteTranslator(inference_client, model_id)
+            msg += '-remote'
+        elif model_config['model_type'] == 'ctranslator2':
             if not model_dir:
                 warn(
                     f'Failed to load ctranslate model for {model_id}: '
@@ -184,13 +268,33 @@ def load_model_translator(
                 )
                 raise ModelLoadingException
 
-            model['translator'] = get_batch_ctranslator(model_dir, 
+            options = model_config.get('ctranslate2', {})
+            inter_threads = options.get('inter_threads', CTRANSLATE_INTER_THREADS)
+            intra_threads = options.get('intra_threads', 0)
+            compute_type = options.get('compute_type', 'default')
+            ctranslator = acquire_resource(
+                model,
+                ('ctranslate2', model_dir, CTRANSLATE_DEVICE, inter_threads, intra_threads, compute_type),
+                lambda: load_ctranslator(
+                    model_dir,
+                    inter_threads=inter_threads,
+                    intra_threads=intra_threads,
+                    compute_type=compute_type,
+                ),
+            )
+            model['translator'] = get_batch_ctranslator(ctranslator, 
                                                         is_multilingual=model_config.get('multilingual'), 
-                                                        lang_map=model_config.get('lang_code_map'))
+                                                        lang_map=model_config.get('lang_code_map'),
+                                                        translate_options={
+                                                            k: options[k] for k in CTRANSLATE2_TRANSLATE_OPTIONS if k in options
+                                                        },
+                                                        batch_tokens=batch_tokens)
             msg += '-ctranslator2'
         elif model_config['model_type'] == 'opus':
-            opus_translator = get_batch_opustranslator(
-                model['src'], model['tgt']
+            opus_translator = acquire_resource(
+                model,
+                ('get_batch_opustranslator', model['src'], model['tgt'], batch_size, batch_tokens, TRANSFORMERS_DEVICE),
+                lambda: get_batch_opustranslator(model['src'], model['tgt'], batch_size=batch_size, batch_tokens=batch_tokens),
             )
             if opus_translator:
                 model['translator'] = opus_translator
@@ -201,8 +305,10 @@ def load_model_translator(
                 )
                 raise ModelLoadingException
         elif model_config['model_type'] == 'opus-big':
-            opus_translator = get_batch_opusbigtranslator(
-                model['src'], model['tgt']
+            opus_translator = acquire_resource(
+                model,
+                ('get_batch_opusbigtranslator', model['src'], model['tgt'], batch_size, batch_tokens, TRANSFORMERS_DEVICE),
+                lambda: get_batch_opusbigtranslator(model['src'], model['tgt'], batch_size=batch_size, batch_tokens=batch_tokens),
             )
             if opus_translator:
                 model['translator'] = opus_translator
@@ -224,7 +330,12 @@ def load_model_translator(
                 nllb_checkpoint_id = 'facebook/' + nllb_checkpoint_id
                 warn(f'Full model id: {nllb_checkpoint_id}')
 
-            translator = get_batch_nllbtranslator(nllb_checkpoint_id, lang_map=model_config.get('lang_code_map'))
+            lang_map = model_config.get('lang_code_map')
+            translator = acquire_resource(
+                model,
+                ('nllb', nllb_checkpoint_id, json.dumps(lang_map, sort_keys=True), batch_size, batch_tokens, TRANSFORMERS_DEVICE),
+                lambda: get_batch_nllbtranslator(nllb_checkpoint_id, lang_map=lang_map, batch_size=batch_size, batch_tokens=batch_tokens),
+            )
             if translator:
                 model['translator'] = translator
                 msg += '-nllb-huggingface-' + nllb_checkpoint_id
@@ -245,7 +356,12 @@ def load_model_translator(
                 m2m100_checkpoint_id = 'facebook/' + m2m100_checkpoint_id
                 warn(f'Full model id: {m2m100_checkpoint_id}')
 
-            translator = get_batch_m2m100translator(m2m100_checkpoint_id, lang_map=model_config.get('lang_code_map'))
+            lang_map = model_config.get('lang_code_map')
+            translator = acquire_resource(
+                model,
+                ('m2m100', m2m100_checkpoint_id, json.dumps(lang_map, sort_keys=True), batch_size, batch_tokens, TRANSFORMERS_DEVICE),
+                lambda: get_batch_m2m100translator(m2m100_checkpoint_id, lang_map=lang_map, batch_size=batch_size, batch_tokens=batch_tokens),
+            )
             if translator:
                 model['translator'] = translator
                 msg += '-m2m100-huggingface-' + m2m100_checkpoint_id
@@ -265,6 +381,37 @@ def load_model_translator(
         model['translator'] = None
 
 
+def load_model_batcher(
+    model: Dict,
+    model_config: Dict,
+    model_id: str,
+    *args,
+    **kwargs,
+) -> None:
+    batching = model_config.get('batching', BATCHING_ENABLED)
+    if not model['translator'] or not batching:
+        return
+    # Remote translators are batched by the inference server, across workers
+    if isinstance(model['translator'], RemoteTranslator):
+        return
+
+    batching = batching if isinstance(batching, dict) else {}
+    # CTranslate2 translates up to inter_threads batches in parallel
+    if model_config['model_type'] == 'ctranslator2':
+        default_in_flight = model_config.get('ctranslate2', {}).get('inter_threads', CTRANSLATE_INTER_THREADS)
+    else:
+        default_in_flight = 1
+    model['batcher'] = TranslationBatcher(
+        model['translator'],
+        max_batch_sentences=batching.get('max_sentences', BATCH_MAX_SENTENCES),
+        max_batch_tokens=batching.get('max_tokens', BATCH_MAX_TOKENS),
+        max_wait_ms=batching.get('max_wait_ms', BATCH_MAX_WAIT_MS),
+        bulk_min_share=batching.get('bulk_min_share', BATCH_BULK_MIN_SHARE),
+        max_in_flight=batching.get('max_in_flight', default_in_flight),
+        name=model_id,
+    )
+
+
 def load_model_desegmenter(
     checks: Dict,
     model: Dict,
@@ -277,7 +424,7 @@ def load_model_desegmenter(
     **kwargs,
 ) -> None:
     if checks['bpe_ok']:
-        model['postprocessors'].append(desegmenter)
+        model['postprocessors'].append(batch_processor(desegmenter))
         pipeline_msg.append('unbpe')
     elif checks['sentencepiece_ok']:
         if not 'tgt_sentencepiece_model' in model_config:
@@ -291,12 +438,13 @@ def load_model_desegmenter(
             model_dir, model_config['tgt_sentencepiece_model']
         )
 
-        model['postprocessors'].append(
-            get_sentencepiece_desegmenter(model_file)
+        sp = acquire_resource(
+            model, ('sentencepiece', model_file), lambda: load_sentencepiece(model_file)
         )
+        model['postprocessors'].append(get_sentencepiece_batch_desegmenter(sp))
         pipeline_msg.append('desentencepiece')
     elif model_config['model_type'] == 'ctranslator2':
-        model['postprocessors'].append(token_desegmenter)
+        model['postprocessors'].append(batch_processor(token_desegmenter))
 
 
 def load_model_detokenizer(
@@ -311,7 +459,7 @@ def load_model_detokenizer(
         and model_config['pipeline']['tokenize']
     ):
         detokenizer = get_moses_detokenizer(model['tgt'])
-        model['postprocessors'].append(detokenizer)
+        model['postprocessors'].append(batch_processor(detokenizer))
         pipeline_msg.append('mdetokenize')
 
 
@@ -326,7 +474,7 @@ def load_model_recaser(
         'recase' in model_config['pipeline']
         and model_config['pipeline']['recase']
     ):
-        model['postprocessors'].append(capitalizer)
+        model['postprocessors'].append(batch_processor(capitalizer))
         pipeline_msg.append('recase')
 
 
@@ -335,7 +483,9 @@ pipeline: List[Callable] = [
     load_model_lowercaser,
     load_model_tokenizer,
     load_model_segmenter,
+    load_model_source_splitter,
     load_model_translator,
+    load_model_batcher,
     load_model_desegmenter,
     load_model_detokenizer,
     load_model_recaser,
@@ -1,11 +1,29 @@
 import re
-from typing import List, Optional, Callable
+from typing import Callable, List, Tuple, Union
 
-from nltk.tokenize import sent_tokenize
+from app.constants import NLTK_PUNKT_DEFAULT_LANGUAGE, NLTK_PUNKT_LANGUAGES, SPLIT_PUNCTUATION
 
 
-def nltk_sentence_segmenter(sentence: str) -> List[str]:
-    return sent_tokenize(sentence)
+def punkt_language(lang: str) -> str:
+    return NLTK_PUNKT_LANGUAGES.get(lang, NLTK_PUNKT_DEFAULT_LANGUAGE)
+
+
+def load_punkt(language: str):
+    import nltk
+
+    try:
+        return nltk.data.load(f'tokenizers/punkt/{language}.pickle')
+    except LookupError:
+        if language == NLTK_PUNKT_DEFAULT_LANGUAGE:
+            raise
+        return nltk.data.load(f'tokenizers/punkt/{NLTK_PUNKT_DEFAULT_LANGUAGE}.pickle')
+
+
+def get_nltk_sentence_segmenter(punkt) -> Callable[[str], List[str]]:
+    def nltk_sentence_segmenter(sentence: str) -> List[str]:
+        return punkt.tokenize(sentence)
+
+    return nltk_sentence_segmenter
 
 
 def desegmenter(items: List[str]) -> str:
@@ -20,36 +38,111 @@ def token_desegmenter(items: List[str]) -> str:
     return ' '.join(items)
 
 
-def get_bpe_segmenter(
-    bpe_codes_path: str,
-) -> Optional[Callable[[str], List[str]]]:
+def load_bpe(bpe_codes_path: str):
     from subword_nmt import apply_bpe
 
-    try:
-        bpe = apply_bpe.BPE(codes=open(bpe_codes_path, 'r'))
-    except Exception as e:
-        return None
-    segmenter = lambda x: bpe.process_line(x.strip()).split()
-    return segmenter
+    with open(bpe_codes_path, 'r') as codes:
+        return apply_bpe.BPE(codes=codes)
 
 
-def get_sentencepiece_segmenter(
-    sp_model_path: str,
-) -> Callable[[str], List[str]]:
-    import sentencepiece as spm
+def get_bpe_segmenter(bpe) -> Callable[[str], List[str]]:
+    def bpe_segmenter(x: str) -> List[str]:
+        return bpe.process_line(x.strip()).split()
 
-    sp = spm.SentencePieceProcessor()
-    sp.load(sp_model_path)
-    segmenter = lambda x: sp.encode_as_pieces(x)
-    return segmenter
+    return bpe_segmenter
 
 
-def get_sentencepiece_desegmenter(
-    sp_model_path: str,
-) -> Callable[[List[str]], str]:
+def load_sentencepiece(sp_model_path: str):
     import sentencepiece as spm
 
     sp = spm.SentencePieceProcessor()
     sp.load(sp_model_path)
-    desentencepiece = lambda x: sp.decode_pieces(x)
-    return desentencepiece
+    return sp
+
+
+def get_sentencepiece_batch_segmenter(sp) -> Callable[[List[str]], List[List[str]]]:
+    def sentencepiece_segmenter(batch: List[str]) -> List[List[str]]:
+        return sp.encode(batch, out_type=str)
+
+    return sentencepiece_segmenter
+
+
+def get_sentencepiece_batch_desegmenter(sp) -> Callable[[List[List[str]]], List[str]]:
+    def sentencepiece_desegmenter(batch: List[List[str]]) -> List[str]:
+        # decode() returns a single string for an empty list
+        if not batch:
+            return []
+        return sp.decode(batch)
+
+    return sentencepiece_desegmenter
+
+
+def _is_safe_boundary(tokens: List[str], j: int, sentencepiece: bool) -> bool:
+    # Cutting before tokens[j] doesn't split a BPE or sentencepiece word
+    if tokens[j - 1].endswith('@@'):
+        return False
+    return not sentencepiece or tokens[j].startswith('▁')
+
+
+def split_long_segment(tokens: List[str], max_tokens: int) -> List[List[str]]:
+    """
+    Splits a preprocessed segment into pieces of at most max_tokens tokens,
+    cutting at word boundaries, preferably after punctuation in the second
+    half of a piece. A piece without any word boundary is cut at max_tokens.
+    """
+    sentencepiece = any(token.startswith('▁') for token in tokens)
+    pieces = []
+    start = 0
+    while len(tokens) - start > max_tokens:
+        end = start + max_tokens
+        # Candidate cuts, latest first
+        boundaries = [j for j in range(end, start, -1) if _is_safe_boundary(tokens, j, sentencepiece)]
+        punctuated = [
+            j for j in boundaries
+            if j > start + max_tokens // 2 and tokens[j - 1].rstrip('@')[-1:] in SPLIT_PUNCTUATION
+        ]
+        cut = (punctuated or boundaries or [end])[0]
+        pieces.append(tokens[start:cut])
+        start = cut
+    pieces.append(tokens[start:])
+    return pieces
+
+
+def get_long_segment_splitter(max_tokens: int) -> Callable[[List], Tuple[List, List[int]]]:
+    """
+    Splits the segments of a preprocessed batch that are longer than
+    max_tokens. Token lists are split as is and text is split into
+    whitespace separated words. Returns the pieces and the number of pieces
+    of each segment, to join their translations with join_segment_pieces.
+    """
+    def long_segment_splitter(batch: List) -> Tuple[List, List[int]]:
+        pieces, counts = [], []
+        for segment in batch:
+            tokens = segment if isinstance(segment, list) else segment.split()
+            if len(tokens) <= max_tokens:
+                pieces.append(segment)
+                counts.append(1)
+                continue
+            segment_pieces = split_long_segment(tokens, max_tokens)
+            if not isinstance(segment, list):
+                segment_pieces = [' '.join(piece) for piece in segment_pieces]
+            pieces.extend(segment_pieces)
+            counts.append(len(segment_pieces))
+        return pieces, counts
+
+    return long_segment_splitter
+
+
+def join_segment_pieces(translations: List[Union[str, List[str]]], counts: List[int]) -> List:
+    joined = []
+    start = 0
+    for count in counts:
+        pieces = translations[start:start + count]
+        start += count
+        if count == 1:
+            joined.append(pieces[0])
+        elif isinstance(pieces[0], list):
+            joined.append([token for piece in pieces for token in piece])
+        else:
+            joined.append(' '.join(pieces))
+    return joined
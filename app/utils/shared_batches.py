@@ -0,0 +1,137 @@
+import pickle
+import struct
+from array import array
+from itertools import chain
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, NamedTuple, Optional
+
+# Names of the buffers created by this process
+_created = set()
+
+
+class SharedBatch(NamedTuple):
+    """Reference to a batch written in a shared memory buffer"""
+    name: str
+    size: int
+
+
+# Batch encodings, told apart by their first byte
+_TOKENS = b'T'
+_TEXTS = b'S'
+_PICKLE = b'P'
+
+_SEPARATOR = '\0'
+_HEADER = struct.Struct('<cI')
+
+
+def encode_batch(batch: List) -> bytes:
+    """
+    Encodes a batch of token lists as the number of tokens of each sentence
+    (an uint32 array) followed by all the tokens, UTF-8 encoded and separated
+    by NUL characters. A batch of strings is encoded the same way, without
+    the counts. Both are built and split by str.join/str.split, without a
+    Python object per token on the way, and are smaller than a pickle of the
+    same batch. Anything else, or text containing NUL, is pickled.
+    """
+    try:
+        if all(type(sentence) is list for sentence in batch):
+            counts = array('I', map(len, batch))
+            text = _SEPARATOR.join(chain.from_iterable(batch))
+            if text.count(_SEPARATOR) == max(sum(counts) - 1, 0):
+                return _HEADER.pack(_TOKENS, len(batch)) + counts.tobytes() + text.encode()
+        elif all(type(sentence) is str for sentence in batch):
+            text = _SEPARATOR.join(batch)
+            if text.count(_SEPARATOR) == max(len(batch) - 1, 0):
+                return _HEADER.pack(_TEXTS, len(batch)) + text.encode()
+    except TypeError:
+        # Tokens that aren't strings
+        pass
+    return _PICKLE + pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode_batch(data) -> List:
+    """Decodes encode_batch's output, from bytes or a memoryview"""
+    kind = bytes(data[:1])
+    if kind == _PICKLE:
+        return pickle.loads(data[1:])
+
+    _, size = _HEADER.unpack_from(data)
+    offset = _HEADER.size
+    if kind == _TEXTS:
+        return str(data[offset:], 'utf-8').split(_SEPARATOR) if size else []
+
+    counts = array('I')
+    counts.frombytes(data[offset:offset + size * counts.itemsize])
+    offset += size * counts.itemsize
+    tokens = str(data[offset:], 'utf-8').split(_SEPARATOR) if sum(counts) else []
+    batch = []
+    start = 0
+    for count in counts:
+        batch.append(tokens[start:start + count])
+        start += count
+    return batch
+
+
+def write_batch(shm: SharedMemory, data: bytes) -> Optional[SharedBatch]:
+    # None when the data doesn't fit in the buffer
+    if len(data) > shm.size:
+        return None
+    shm.buf[:len(data)] = data
+    return SharedBatch(shm.name, len(data))
+
+
+def read_batch(shm: SharedMemory, ref: SharedBatch) -> List:
+    # Decoded from a view of the buffer, not from a copy of it
+    with shm.buf[:ref.size] as data:
+        return decode_batch(data)
+
+
+def attach_shared_memory(name: str) -> SharedMemory:
+    """
+    Opens a buffer created by another process. Its creator unlinks it, so it
+    is taken off this process's resource tracker, which would otherwise
+    unlink it (and warn about a leak) when this process exits.
+    """
+    shm = SharedMemory(name=name)
+    if name not in _created:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+class SharedBatchBuffer:
+    """
+    Shared memory buffer owned by one client connection. The request batch
+    is written to it for the inference server to read, and the server writes
+    the translations back in place when they fit. The buffer grows to fit
+    larger requests.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._shm: Optional[SharedMemory] = None
+
+    @property
+    def shm(self) -> SharedMemory:
+        if self._shm is None:
+            self._shm = SharedMemory(create=True, size=self.size)
+            _created.add(self._shm.name)
+        return self._shm
+
+    def write(self, batch: List) -> SharedBatch:
+        data = encode_batch(batch)
+        # Leave room for translations a few times longer than the source
+        if 4 * len(data) > self.size:
+            self.close()
+            self.size = max(4 * len(data), 2 * self.size)
+        return write_batch(self.shm, data)
+
+    def read(self, ref: SharedBatch) -> List:
+        return read_batch(self.shm, ref)
+
+    def close(self) -> None:
+        if self._shm is not None:
+            _created.discard(self._shm.name)
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
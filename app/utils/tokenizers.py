@@ -1,42 +1,53 @@
+import re
 from typing import Callable, List
 
 
 def get_moses_tokenizer(lang: str) -> Callable[[str], str]:
     from sacremoses import MosesTokenizer
 
-    moses_tokenizer = MosesTokenizer(lang=lang)
-    tokenizer = lambda x: moses_tokenizer.tokenize(x, return_str=True)
-    return tokenizer
+    tokenizer = MosesTokenizer(lang=lang)
+
+    def moses_tokenizer(x: str) -> str:
+        return tokenizer.tokenize(x, return_str=True)
+
+    return moses_tokenizer
 
 
 def get_moses_detokenizer(lang: str) -> Callable[[str], str]:
     from sacremoses import MosesDetokenizer
 
-    moses_detokenizer = MosesDetokenizer(lang=lang)
-    tokenizer = lambda x: moses_detokenizer.detokenize(
-        x.split(), return_str=True
-    )
-    return tokenizer
+    detokenizer = MosesDetokenizer(lang=lang)
 
+    def moses_detokenizer(x: str) -> str:
+        return detokenizer.detokenize(x.split(), return_str=True)
 
-def tokenize_with_punkset(doc: str, punkset: List[str]) -> List[str]:
-    tokens = []
-    doc = ' '.join(doc.split())
+    return moses_detokenizer
+
+
+def compile_punkset_splitter(punkset: List[str]) -> Callable[[str], List[str]]:
+    # A sentence runs up to and including the next punctuation character,
+    # the text after the last one is a sentence of its own. Only single
+    # characters in punkset can match
+    chars = ''.join(re.escape(p) for p in dict.fromkeys(punkset) if len(p) == 1)
+    pattern = re.compile(f'[^{chars}]*[{chars}]|[^{chars}]+') if chars else None
 
-    curr_sent = ''
-    for c in doc:
-        if c in punkset:
-            curr_sent += c
-            if curr_sent:
-                tokens.append(curr_sent.strip())
-                curr_sent = ''
-        else:
-            curr_sent += c
-    if curr_sent:
-        tokens.append(curr_sent.strip())
+    def split(doc: str) -> List[str]:
+        doc = ' '.join(doc.split())
+        if pattern is None:
+            return [doc] if doc else []
+        return [sentence.strip() for sentence in pattern.findall(doc)]
 
-    return tokens
+    return split
+
+
+def tokenize_with_punkset(doc: str, punkset: List[str]) -> List[str]:
+    return compile_punkset_splitter(punkset)(doc)
 
 
 def get_custom_tokenizer(punkset: List[str]) -> Callable[[str], List[str]]:
-    return lambda x: tokenize_with_punkset(x, punkset)
+    split = compile_punkset_splitter(punkset)
+
+    def custom_sentence_segmenter(x: str) -> List[str]:
+        return split(x)
+
+    return custom_sentence_segmenter
@@ -1,67 +1,217 @@
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple
+import functools
+from contextlib import nullcontext
 import logging
 
 from app.helpers.config import Config
+from app.utils import metrics
+from app.utils.cache import sentence_key, translation_cache
+from app.utils.inference_server import RemoteTranslator
+from app.utils.persistent_cache import translation_store
+from app.utils.segmenters import join_segment_pieces
 from app.utils.utils import parse_model_id, get_model_id
-from app.constants import MULTIMODALCODE
+from app.constants import INTERACTIVE_PRIORITY, MULTIMODALCODE
+from app.settings import DEBUG_LOG_TEXT
 
-DEVDEBUG = True
 logger = logging.getLogger('console_logger')
 
-# TODO: This should get text batch
-def translate_text(model_id: str, text: str, src: str, tgt: str) -> Optional[str]:    
-    config = Config()
-    if DEVDEBUG: logger.debug(f'translate.py/translate_text for {model_id} {src}->{tgt} | {text}') #print('>translate.py/translate_text for', model_id, text, src, tgt)
-
-    model = config.loaded_models[model_id]
 
+def segment_text(model: Dict, text: str) -> List[str]:
     if model['sentence_segmenter']:
-        sentence_batch = model['sentence_segmenter'](
-            text
-        )
-    else:
-        sentence_batch = [text]
+        return model['sentence_segmenter'](text)
+    return [text]
+
+
+def segment_model_text(model_id: str, text: str, src: str, tgt: str) -> List[str]:
+    model = Config().get_model(model_id)
+    with metrics.stage_timer(model_id, src, tgt, 'segment'):
+        return segment_text(model, text)
+
+
+def get_translator(model: Dict, priority: str = INTERACTIVE_PRIORITY) -> Callable:
+    # Go through the model's micro-batcher when it has one so that
+    # sentences from concurrent requests share translator calls and are
+    # scheduled by priority
+    if model['batcher']:
+        return functools.partial(model['batcher'], priority=priority)
+    if isinstance(model['translator'], RemoteTranslator):
+        return functools.partial(model['translator'], priority=priority)
+    return model['translator']
+
+
+def translate_with_cache(
+    model_id: str,
+    model: Dict,
+    sentence_batch: List,
+    src: str,
+    tgt: str,
+    priority: str = INTERACTIVE_PRIORITY,
+) -> List:
+    translator = get_translator(model, priority)
+    if not translation_cache.enabled:
+        translations = translator(sentence_batch, src, tgt)
+        metrics.count_translator_tokens(model_id, src, tgt, sentence_batch, translations)
+        return translations
+
+    translations: List = [None] * len(sentence_batch)
+    misses: Dict = {}
+    for i, sentence in enumerate(sentence_batch):
+        key = (model_id, src, tgt, sentence_key(sentence))
+        found, translation = translation_cache.get(key)
+        if found:
+            translations[i] = translation
+        else:
+            misses.setdefault(key, []).append(i)
 
-    if DEVDEBUG: logger.debug(f'>translate_text:sentence_batch {sentence_batch}')
+    # Translate all the misses together, each distinct sentence only once
+    if misses:
+        miss_keys = list(misses)
+        miss_batch = [sentence_batch[misses[key][0]] for key in miss_keys]
+        miss_translations = translator(miss_batch, src, tgt)
+        metrics.count_translator_tokens(model_id, src, tgt, miss_batch, miss_translations)
+        for key, translation in zip(miss_keys, miss_translations):
+            translation_cache.put(key, translation)
+            for i in misses[key]:
+                translations[i] = translation
+
+    logger.debug('translate_with_cache: %d of %d sentences not in cache', len(misses), len(sentence_batch))
+
+    return translations
+
+
+def run_pipeline(
+    model_id: str,
+    sentence_batch: List[str],
+    src: str,
+    tgt: str,
+    priority: str = INTERACTIVE_PRIORITY,
+) -> List[str]:
+    config = Config()
+    model = config.get_model(model_id)
 
     # Pre-translate
     if model['pretranslatechain']:
         for pair in model['pretranslatechain']:
             chainmodel_src, chainmodel_tgt, chainmodel_alt = parse_model_id(pair)
-            if not pair in config.loaded_models:
+            if not pair in config.registered_models:
                 pair = get_model_id(MULTIMODALCODE, MULTIMODALCODE) #TODO: Not tested with alt
-            sentence_batch = config.loaded_models[pair]['translator'](sentence_batch, chainmodel_src, chainmodel_tgt)
-            if DEVDEBUG: logger.debug(f'>translate_text:Pre-translate {pair}, {chainmodel_src}-{chainmodel_tgt} {sentence_batch}')
-    
+            with metrics.stage_timer(model_id, src, tgt, f'pretranslate:{pair}'):
+                sentence_batch = get_translator(config.get_model(pair), priority)(sentence_batch, chainmodel_src, chainmodel_tgt)
+            logger.debug('run_pipeline: pre-translated with %s (%s-%s)', pair, chainmodel_src, chainmodel_tgt)
+            if DEBUG_LOG_TEXT: logger.debug('run_pipeline: pre-translated batch %s', sentence_batch)
+
     # Preprocess
     for proc in model['preprocessors']:
-        sentence_batch = [proc(s) for s in sentence_batch]
-        if DEVDEBUG: logger.debug(f'>translate_text:Preprocess/sentence_batch {sentence_batch}')
-    
-    # Translate batch
+        with metrics.stage_timer(model_id, src, tgt, metrics.processor_stage('preprocess', proc)):
+            sentence_batch = proc(sentence_batch)
+        if DEBUG_LOG_TEXT: logger.debug('run_pipeline: preprocessed batch %s', sentence_batch)
+
+    # Split segments over the model's source token limit, their pieces are
+    # translated in the same batch and joined back before postprocessing
+    piece_counts = None
+    if model['source_splitter']:
+        sentence_batch, piece_counts = model['source_splitter'](sentence_batch)
+
+    # Translate batch. Batched translator calls are timed by the batcher,
+    # apart from the time the sentences wait in its queue
     if model['translator']:
-        translated_sentence_batch = model[
-            'translator'
-        ](sentence_batch, src, tgt)
-        if DEVDEBUG: logger.debug(f'>translate_text:Translate batch /translated_sentence_batch {translated_sentence_batch}')
+        with nullcontext() if model['batcher'] else metrics.stage_timer(model_id, src, tgt, 'translate'):
+            translated_sentence_batch = translate_with_cache(
+                model_id, model, sentence_batch, src, tgt, priority
+            )
     else:
         translated_sentence_batch = sentence_batch
-        if DEVDEBUG: logger.debug(f'>translate_text:else Translate batch /translated_sentence_batch {translated_sentence_batch}')
-    
+    if piece_counts and len(piece_counts) < len(translated_sentence_batch):
+        translated_sentence_batch = join_segment_pieces(translated_sentence_batch, piece_counts)
+    if DEBUG_LOG_TEXT: logger.debug('run_pipeline: translated batch %s', translated_sentence_batch)
+
     # Postprocess
     tgt_sentences = translated_sentence_batch
     for proc in model['postprocessors']:
-        tgt_sentences = [proc(s) for s in tgt_sentences]
-    if DEVDEBUG: logger.debug(f'>translate_text:tgt_sentences {tgt_sentences}')
-    
+        with metrics.stage_timer(model_id, src, tgt, metrics.processor_stage('postprocess', proc)):
+            tgt_sentences = proc(tgt_sentences)
+    if DEBUG_LOG_TEXT: logger.debug('run_pipeline: postprocessed batch %s', tgt_sentences)
+
     # Post-translate
     if model['posttranslatechain']:
         for pair in model['posttranslatechain']:
             chainmodel_src, chainmodel_tgt, chainmodel_alt = parse_model_id(pair)
-            if not pair in config.loaded_models:
+            if not pair in config.registered_models:
                 pair = get_model_id(MULTIMODALCODE, MULTIMODALCODE) #TODO: Not tested with alt
-            tgt_sentences = config.loaded_models[pair]['translator'](tgt_sentences, chainmodel_src, chainmodel_tgt)
-            if DEVDEBUG: logger.debug(f'>translate_text:Post-translate {pair}, {chainmodel_src}-{chainmodel_tgt} {tgt_sentences}')
-    tgt_text = ' '.join(tgt_sentences)
+            with metrics.stage_timer(model_id, src, tgt, f'posttranslate:{pair}'):
+                tgt_sentences = get_translator(config.get_model(pair), priority)(tgt_sentences, chainmodel_src, chainmodel_tgt)
+            logger.debug('run_pipeline: post-translated with %s (%s-%s)', pair, chainmodel_src, chainmodel_tgt)
+            if DEBUG_LOG_TEXT: logger.debug('run_pipeline: post-translated batch %s', tgt_sentences)
+
+    return tgt_sentences
+
+
+def translate_sentences(
+    model_id: str,
+    sentence_batch: List[str],
+    src: str,
+    tgt: str,
+    priority: str = INTERACTIVE_PRIORITY,
+) -> List[str]:
+    if not sentence_batch:
+        return []
+
+    if not translation_store.enabled:
+        translations = run_pipeline(model_id, sentence_batch, src, tgt, priority)
+        metrics.count_sentences(model_id, src, tgt, sentence_batch, translations)
+        return translations
+
+    # Only sentences missing from the persistent store go through the pipeline
+    stored = translation_store.get_many(model_id, src, tgt, sentence_batch)
+    misses = list(dict.fromkeys(s for s in sentence_batch if s not in stored))
+    if misses:
+        translations = run_pipeline(model_id, misses, src, tgt, priority)
+        translation_store.put_many(model_id, src, tgt, zip(misses, translations))
+        stored.update(zip(misses, translations))
+
+    logger.debug('translate_sentences: %d of %d sentences not in translation store', len(misses), len(sentence_batch))
+
+    translations = [stored[s] for s in sentence_batch]
+    metrics.count_sentences(model_id, src, tgt, sentence_batch, translations)
+
+    return translations
+
+
+def translate_texts(
+    model_id: str,
+    texts: List[str],
+    src: str,
+    tgt: str,
+    priority: str = INTERACTIVE_PRIORITY,
+) -> List[str]:
+    config = Config()
+    logger.debug('translate_texts: %d texts for %s (%s-%s)', len(texts), model_id, src, tgt)
+
+    model = config.get_model(model_id)
+
+    # Segment every text and pool the sentences, remembering which slice
+    # of the pool belongs to which text
+    sentence_pool: List[str] = []
+    offsets: List[Tuple[int, int]] = []
+    with metrics.stage_timer(model_id, src, tgt, 'segment'):
+        for text in texts:
+            sentences = segment_text(model, text)
+            offsets.append((len(sentence_pool), len(sentence_pool) + len(sentences)))
+            sentence_pool.extend(sentences)
+
+    logger.debug('translate_texts: %d sentences', len(sentence_pool))
+    if DEBUG_LOG_TEXT: logger.debug('translate_texts: sentence pool %s', sentence_pool)
+
+    tgt_sentences = translate_sentences(model_id, sentence_pool, src, tgt, priority)
+
+    return [' '.join(tgt_sentences[start:end]) for start, end in offsets]
+
 
-    return tgt_text
+def translate_text(
+    model_id: str,
+    text: str,
+    src: str,
+    tgt: str,
+    priority: str = INTERACTIVE_PRIORITY,
+) -> Optional[str]:
+    return translate_texts(model_id, [text], src, tgt, priority)[0]
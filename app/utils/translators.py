@@ -1,17 +1,66 @@
 import os
 import importlib
-from typing import Optional, Callable
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
 
 from app.constants import HELSINKI_NLP
+from app.utils.utils import length_sorted_batches
 from app.settings import (
     CTRANSLATE_DEVICE,
     CTRANSLATE_INTER_THREADS,
+    DECODE_BATCH_TOKENS,
+    TRANSFORMERS_BATCH_SIZE,
     TRANSFORMERS_DEVICE,
+    TRANSFORMERS_PIPELINE_CACHE_SIZE,
     MODELS_ROOT_DIR,
 )
 
-def dummy_translator(content: str) -> str:
-    return content
+# Rough number of characters per subword token
+CHARS_PER_TOKEN = 4
+
+
+def translate_length_buckets(
+    translate_bucket: Callable[[List], List],
+    src_texts: List,
+    lengths: List[int],
+    batch_size: int,
+    max_tokens: int = 0,
+) -> List:
+    # Decode buckets of similar length sentences, each padded only to its own
+    # longest sentence, and put the translations back in input order
+    translations = [None] * len(src_texts)
+    for indices in length_sorted_batches(lengths, batch_size, max_tokens):
+        for i, translation in zip(indices, translate_bucket([src_texts[i] for i in indices])):
+            translations[i] = translation
+    return translations
+
+
+def pipeline_translate_batch(
+    translator_pipeline: Callable, src_texts: List[str], batch_size: int, max_tokens: int = DECODE_BATCH_TOKENS
+) -> List[str]:
+    # Lengths are estimated in characters rather than by tokenizing the
+    # batch here, which the pipeline does again for each bucket
+    def translate_bucket(texts):
+        outputs = translator_pipeline(texts, max_length=400, batch_size=len(texts))
+        return [output["translation_text"] for output in outputs]
+
+    return translate_length_buckets(
+        translate_bucket,
+        src_texts,
+        [len(text) for text in src_texts],
+        batch_size,
+        max_tokens * CHARS_PER_TOKEN,
+    )
+
+def pair_pipeline_cache(
+    build_pipeline: Callable[[str, str], Callable], maxsize: int = TRANSFORMERS_PIPELINE_CACHE_SIZE
+) -> Callable[[str, str], Callable]:
+    # Pipelines of a multilingual model are built on first use of a
+    # (src, tgt) pair and kept in a bounded LRU
+    return lru_cache(maxsize=maxsize)(build_pipeline)
+
+def dummy_translator(src_texts, src=None, tgt=None):
+    return src_texts
 
 def get_custom_translator(model_tag: str) -> Callable:
     translator_info = model_tag.split('/')
@@ -44,15 +93,38 @@ def get_ctranslator(ctranslator_model_path: str) -> Callable:
     return translator
 
 
-def get_batch_ctranslator(ctranslator_model_path: str, is_multilingual: bool = False, lang_map:dict=None) -> Callable:
+def load_ctranslator(
+    ctranslator_model_path: str,
+    device: str = CTRANSLATE_DEVICE,
+    inter_threads: int = CTRANSLATE_INTER_THREADS,
+    intra_threads: int = 0,
+    compute_type: str = 'default',
+):
     from ctranslate2 import Translator
 
-    ctranslator = Translator(
+    return Translator(
         ctranslator_model_path,
-        device=CTRANSLATE_DEVICE,
-        inter_threads=CTRANSLATE_INTER_THREADS,
+        device=device,
+        inter_threads=inter_threads,
+        intra_threads=intra_threads,
+        compute_type=compute_type,
     )
 
+
+def get_batch_ctranslator(
+    ctranslator,
+    is_multilingual: bool = False,
+    lang_map: dict = None,
+    translate_options: Optional[Dict] = None,
+    batch_tokens: int = DECODE_BATCH_TOKENS,
+) -> Callable:
+    # Decoding options (beam_size, batch_type...) passed to every translate_batch call
+    translate_options = dict(translate_options or {})
+    # CTranslate2 sorts the batch by length, splits it into sub-batches of at
+    # most batch_tokens tokens and runs them in parallel on its replicas
+    if batch_tokens and not {'max_batch_size', 'batch_type'} & set(translate_options):
+        translate_options.update(max_batch_size=batch_tokens, batch_type='tokens')
+
     def translator(src_texts, src=None, tgt=None):
         if is_multilingual:
             if lang_map:
@@ -62,10 +134,10 @@ def get_batch_ctranslator(ctranslator_model_path: str, is_multilingual: bool = F
             target_prefix = [[tgt]] * len(src_texts)
             src_texts = [sent + ["</s>", src] for sent in src_texts]
 
-            translations = ctranslator.translate_batch(src_texts, target_prefix=target_prefix)
+            translations = ctranslator.translate_batch(src_texts, target_prefix=target_prefix, **translate_options)
             translations = [translation.hypotheses[0][1:] for translation in translations]
         else:
-            translations = [s.hypotheses[0] for s in ctranslator.translate_batch(src_texts)]
+            translations = [s.hypotheses[0] for s in ctranslator.translate_batch(src_texts, **translate_options)]
 
         return translations
 
@@ -73,7 +145,7 @@ def get_batch_ctranslator(ctranslator_model_path: str, is_multilingual: bool = F
 
 
 def get_batch_opustranslator(
-    src: str, tgt: str
+    src: str, tgt: str, batch_size: int = TRANSFORMERS_BATCH_SIZE, batch_tokens: int = DECODE_BATCH_TOKENS
 ) -> Optional[Callable[[str], str]]:
     from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
 
@@ -85,8 +157,7 @@ def get_batch_opustranslator(
     def translator(src_texts, src=None, tgt=None):
         if not src_texts:
             return ''
-        return [translator_pipeline(text, max_length=400)[0]["translation_text"] 
-                    for text in src_texts]
+        return pipeline_translate_batch(translator_pipeline, src_texts, batch_size, batch_tokens)
 
     try:
         tokenizer = AutoTokenizer.from_pretrained(local_model)
@@ -110,7 +181,7 @@ def get_batch_opustranslator(
     return None
 
 def get_batch_opusbigtranslator(
-    src: str, tgt: str
+    src: str, tgt: str, batch_size: int = TRANSFORMERS_BATCH_SIZE, batch_tokens: int = DECODE_BATCH_TOKENS
 ) -> Optional[Callable[[str], str]]:
     from transformers import MarianMTModel, MarianTokenizer, pipeline
 
@@ -122,8 +193,7 @@ def get_batch_opusbigtranslator(
     def translator(src_texts, src=None, tgt=None):
         if not src_texts:
             return ''
-        return [translator_pipeline(text, max_length=400)[0]["translation_text"] 
-                    for text in src_texts]
+        return pipeline_translate_batch(translator_pipeline, src_texts, batch_size, batch_tokens)
 
     try:
         tokenizer = MarianTokenizer.from_pretrained(local_model)
@@ -149,7 +219,7 @@ def get_batch_opusbigtranslator(
     return None
 
 
-def get_batch_nllbtranslator(nllb_checkpoint_id:str, lang_map:dict=None) -> Optional[Callable[[str], str]]:
+def get_batch_nllbtranslator(nllb_checkpoint_id:str, lang_map:dict=None, batch_size:int=TRANSFORMERS_BATCH_SIZE, batch_tokens:int=DECODE_BATCH_TOKENS) -> Optional[Callable[[str], str]]:
 
     from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
 
@@ -158,6 +228,17 @@ def get_batch_nllbtranslator(nllb_checkpoint_id:str, lang_map:dict=None) -> Opti
 
     is_model_loaded, is_tokenizer_loaded = False, False
 
+    get_pair_pipeline = pair_pipeline_cache(
+        lambda src, tgt: pipeline(
+            "translation",
+            model=model,
+            tokenizer=tokenizer,
+            src_lang=src,
+            tgt_lang=tgt,
+            device=TRANSFORMERS_DEVICE
+        )
+    )
+
     def translator(src_texts, src, tgt):
         if lang_map:
             src = lang_map.get(src) if src in lang_map else src
@@ -166,18 +247,9 @@ def get_batch_nllbtranslator(nllb_checkpoint_id:str, lang_map:dict=None) -> Opti
         if not src_texts:
             return ''
         else:
-            #pipeline was here
-            nllb_translator = pipeline(
-                "translation",
-                model=model,
-                tokenizer=tokenizer,
-                src_lang=src,
-                tgt_lang=tgt,
-                device=TRANSFORMERS_DEVICE
-            )
-
-            return [nllb_translator(text, max_length=400)[0]["translation_text"] 
-                    for text in src_texts]
+            nllb_translator = get_pair_pipeline(src, tgt)
+
+            return pipeline_translate_batch(nllb_translator, src_texts, batch_size, batch_tokens)
 
     try:
         tokenizer = AutoTokenizer.from_pretrained(local_model)
@@ -203,7 +275,7 @@ def get_batch_nllbtranslator(nllb_checkpoint_id:str, lang_map:dict=None) -> Opti
         return translator
     return None
 
-def get_batch_m2m100translator(m2m100_checkpoint_id:str, lang_map:dict=None) -> Optional[Callable[[str], str]]:
+def get_batch_m2m100translator(m2m100_checkpoint_id:str, lang_map:dict=None, batch_size:int=TRANSFORMERS_BATCH_SIZE, batch_tokens:int=DECODE_BATCH_TOKENS) -> Optional[Callable[[str], str]]:
 
     from transformers import M2M100Tokenizer, M2M100ForConditionalGeneration, pipeline
 
@@ -212,6 +284,17 @@ def get_batch_m2m100translator(m2m100_checkpoint_id:str, lang_map:dict=None) ->
 
     is_model_loaded, is_tokenizer_loaded = False, False
 
+    get_pair_pipeline = pair_pipeline_cache(
+        lambda src, tgt: pipeline(
+            "translation",
+            model=model,
+            tokenizer=tokenizer,
+            src_lang=src,
+            tgt_lang=tgt,
+            device=TRANSFORMERS_DEVICE
+        )
+    )
+
     def translator(src_texts, src, tgt):
         if lang_map:
             src = lang_map.get(src) if src in lang_map else src
@@ -220,18 +303,9 @@ def get_batch_m2m100translator(m2m100_checkpoint_id:str, lang_map:dict=None) ->
         if not src_texts:
             return ''
         else:
-            #pipeline was here
-            m2m100_translator = pipeline(
-                "translation",
-                model=model,
-                tokenizer=tokenizer,
-                src_lang=src,
-                tgt_lang=tgt,
-                device=TRANSFORMERS_DEVICE
-            )
-
-            return [m2m100_translator(text, max_length=400)[0]["translation_text"] 
-                    for text in src_texts]
+            m2m100_translator = get_pair_pipeline(src, tgt)
+
+            return pipeline_translate_batch(m2m100_translator, src_texts, batch_size, batch_tokens)
 
     try:
         tokenizer = M2M100Tokenizer.from_pretrained(local_model)
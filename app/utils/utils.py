@@ -1,4 +1,5 @@
-from typing import Optional, Tuple
+import functools
+from typing import Any, Callable, List, Optional, Tuple
 
 from app.constants import MODEL_TAG_SEPARATOR
 
@@ -9,6 +10,15 @@ def lowercaser(word: str) -> str:
 def capitalizer(word: str) -> str:
     return word.capitalize()
 
+def batch_processor(processor: Callable[[Any], Any]) -> Callable[[List], List]:
+    # Pipeline processors take and return a whole sentence batch. Processors
+    # without a native batch API are mapped over the batch, keeping their name
+    @functools.wraps(processor)
+    def process_batch(batch: List) -> List:
+        return [processor(x) for x in batch]
+
+    return process_batch
+
 def get_model_id(src: str, tgt: str, alt_id: Optional[str] = None) -> str:
     model_id = src + MODEL_TAG_SEPARATOR + tgt
     if alt_id:
@@ -28,3 +38,25 @@ def parse_model_id(model_id: str) -> Optional[Tuple[str, str, str]]:
     tgt = fields[1]
 
     return src, tgt, alt
+
+
+def length_sorted_batches(lengths: List[int], batch_size: int, max_tokens: int = 0) -> List[List[int]]:
+    """
+    Groups item indices into batches of at most batch_size items of similar
+    length, so that padding within a batch is minimal. With max_tokens, a
+    batch is also cut before its padded size (items x longest item) exceeds
+    it, so batches of short items hold more of them than batches of long
+    ones. Callers restore the original order using the returned indices.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batch_size = max(1, batch_size)
+    batches, batch = [], []
+    for i in order:
+        # Items are in increasing length, so item i is the longest of its batch
+        if batch and (len(batch) == batch_size or (max_tokens and (len(batch) + 1) * lengths[i] > max_tokens)):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
@@ -1,21 +1,35 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import json
 import logging
 
+from app.exceptions import InferenceQueueFullException, ModelLoadingException
 from app.helpers.config import Config
+from app.helpers.executor import inference_executors
 from app.utils.utils import get_model_id
 from app.models.v1.translate import (
     BatchTranslationRequest,
     BatchTranslationResponse,
+    JobStatusResponse,
     LanguagesResponse,
+    ReadinessResponse,
     TranslationRequest,
     TranslationResponse,
 )
-from app.utils.translate import translate_text
-from app.constants import MULTIMODALCODE
+from app.utils.translate import (
+    segment_model_text,
+    translate_sentences,
+    translate_text,
+    translate_texts,
+)
+from app.utils import metrics
+from app.utils.jobs import job_manager
+from app.constants import BULK_PRIORITY, INTERACTIVE_PRIORITY, MULTIMODALCODE
+from app.settings import STREAM_BATCH_SIZE
 
 translate_v1 = APIRouter(prefix='/api/v1/translate')
 
-DEVDEBUG = True
 logger = logging.getLogger('console_logger')
 
 def fetch_model_data_from_request(request):
@@ -34,18 +48,21 @@ def fetch_model_data_from_request(request):
 
     compatible_model_ids = config._lookup_pair_in_languages_list(src, tgt, request.alt)
 
+    if not compatible_model_ids and not config.ready:
+        raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f'Models are still loading. Language pair {model_id} is not available yet.',
+            )
+
     if not compatible_model_ids:
         raise HTTPException(
                 status_code=406,
                 detail=f'Language pair {model_id} is not supported.',
             )
 
-    if DEVDEBUG: 
-        logger.debug(f'compatible_model_ids {compatible_model_ids}')
-        if use_multi:
-            logger.debug(f'use_multi {use_multi}')
+    logger.debug('compatible_model_ids %s, use_multi %s', compatible_model_ids, use_multi)
     
-    regular_model_exists = model_id in config.loaded_models
+    regular_model_exists = model_id in config.registered_models
     multilingual_model_exists_for_pair = any([mid.startswith(MULTIMODALCODE) for mid in compatible_model_ids])
 
     if not regular_model_exists and not use_multi and multilingual_model_exists_for_pair:
@@ -67,10 +84,25 @@ def fetch_model_data_from_request(request):
             detail=f'No multilingual model support for pair {src}-{tgt}. Remove flag `use_multi` from request',
         )
 
-    if DEVDEBUG: logger.debug(f'model_id {model_id}')
+    logger.debug('model_id %s', model_id)
 
     return model_id, src, tgt
 
+async def run_inference(fn, *args, priority=INTERACTIVE_PRIORITY):
+    # Bulk requests get their own pool so they can't hold every worker
+    try:
+        return await inference_executors[priority].run(fn, *args)
+    except InferenceQueueFullException:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Translation queue is full. Try again later.',
+        )
+    except ModelLoadingException:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Translation model could not be loaded.',
+        )
+
 @translate_v1.post("", status_code=status.HTTP_200_OK)
 @translate_v1.post('/', status_code=status.HTTP_200_OK)
 async def translate_sentence(
@@ -78,28 +110,114 @@ async def translate_sentence(
 ) -> TranslationResponse:
 
     model_id, src, tgt = fetch_model_data_from_request(request)
+    metrics.count_request('translate', model_id, src, tgt)
+    priority = request.priority or INTERACTIVE_PRIORITY
 
-    translation = translate_text(model_id, request.text, src, tgt)
+    translation = await run_inference(
+        translate_text, model_id, request.text, src, tgt, priority, priority=priority
+    )
 
     return TranslationResponse(translation=translation)
 
+@translate_v1.post('/stream', status_code=status.HTTP_200_OK)
+async def translate_stream(
+    request: TranslationRequest,
+) -> StreamingResponse:
+    model_id, src, tgt = fetch_model_data_from_request(request)
+    metrics.count_request('stream', model_id, src, tgt)
+    priority = request.priority or INTERACTIVE_PRIORITY
+
+    sentences = await run_inference(
+        segment_model_text, model_id, request.text, src, tgt, priority=priority
+    )
+
+    # One JSON object per line, sent as soon as each small batch of
+    # sentences is translated
+    async def stream_translations():
+        for start in range(0, len(sentences), STREAM_BATCH_SIZE):
+            batch = sentences[start:start + STREAM_BATCH_SIZE]
+            try:
+                translations = await run_inference(
+                    translate_sentences, model_id, batch, src, tgt, priority,
+                    priority=priority,
+                )
+            except HTTPException as e:
+                yield json.dumps({'error': e.detail}) + '\n'
+                return
+            for index, translation in enumerate(translations, start=start):
+                yield json.dumps(
+                    {'index': index, 'translation': translation}, ensure_ascii=False
+                ) + '\n'
+
+    return StreamingResponse(stream_translations(), media_type='application/x-ndjson')
+
 @translate_v1.post('/batch', status_code=status.HTTP_200_OK)
 async def translate_batch(
     request: BatchTranslationRequest,
 ) -> BatchTranslationResponse:
-    config = Config()
-
     model_id, src, tgt = fetch_model_data_from_request(request)
+    metrics.count_request('batch', model_id, src, tgt)
+    priority = request.priority or BULK_PRIORITY
 
-    translated_batch = []
-    for sentence in request.texts:
-        translation = translate_text(model_id, sentence, src, tgt)
-        translated_batch.append(translation)
-    
-    #TODO: translated_batch = translate_text(model_id, request.texts)
+    translated_batch = await run_inference(
+        translate_texts, model_id, request.texts, src, tgt, priority, priority=priority
+    )
 
     return BatchTranslationResponse(translation=translated_batch)
 
+def check_jobs_enabled():
+    if not job_manager.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail='Translation jobs are disabled. Set MT_API_JOBS_DIR to enable them.',
+        )
+
+def get_job_status(job_id: str):
+    check_jobs_enabled()
+    try:
+        return job_manager.status(job_id)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f'Job {job_id} not found.',
+        )
+
+@translate_v1.post('/jobs', status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(
+    request: BatchTranslationRequest,
+) -> JobStatusResponse:
+    check_jobs_enabled()
+
+    model_id, src, tgt = fetch_model_data_from_request(request)
+    metrics.count_request('jobs', model_id, src, tgt)
+
+    job = await run_in_threadpool(job_manager.submit, model_id, request.texts, src, tgt)
+
+    return JobStatusResponse(**job)
+
+@translate_v1.get('/jobs/{job_id}', status_code=status.HTTP_200_OK)
+async def job_status(job_id: str) -> JobStatusResponse:
+    return JobStatusResponse(**get_job_status(job_id))
+
+@translate_v1.get('/jobs/{job_id}/result', status_code=status.HTTP_200_OK)
+async def job_result(job_id: str) -> BatchTranslationResponse:
+    job = get_job_status(job_id)
+
+    translations = await run_in_threadpool(job_manager.results, job_id)
+    if translations is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f'Job {job_id} is {job["status"]}.',
+        )
+
+    return BatchTranslationResponse(translation=translations)
+
+@translate_v1.delete('/jobs/{job_id}', status_code=status.HTTP_200_OK)
+async def cancel_job(job_id: str) -> JobStatusResponse:
+    get_job_status(job_id)
+
+    return JobStatusResponse(**job_manager.cancel(job_id))
+
 @translate_v1.get('', status_code=status.HTTP_200_OK)
 @translate_v1.get('/', status_code=status.HTTP_200_OK)
 async def languages() -> LanguagesResponse:
@@ -108,3 +226,14 @@ async def languages() -> LanguagesResponse:
     return LanguagesResponse(
         languages=config.language_codes, models=config.languages_list
     )
+
+@translate_v1.get('/ready', status_code=status.HTTP_200_OK)
+async def readiness(response: Response) -> ReadinessResponse:
+    config = Config()
+
+    if not config.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+
+    return ReadinessResponse(
+        ready=config.ready, loaded_models=list(config.loaded_models.keys())
+    )
@@ -0,0 +1,137 @@
+"""
+Builds a tiny randomly initialised CTranslate2 Transformer with a
+sentencepiece model trained on the benchmark corpus, so that the
+ctranslator2 path can be benchmarked offline. The translations are
+meaningless; only the cost of running the pipeline matters.
+
+    python -m benchmarks.make_tiny_ct2_model [--output-dir DIR]
+"""
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(BENCHMARKS_DIR, 'requests.jsonl')
+DEFAULT_OUTPUT_DIR = os.path.join(BENCHMARKS_DIR, 'models', 'tiny-ct2-en-sw')
+
+SPECIAL_TOKENS = ['<unk>', '<s>', '</s>']
+
+
+def corpus_texts(corpus_path: str, src: str):
+    with open(corpus_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            request = json.loads(line)
+            if request['src'] == src:
+                yield from request.get('texts', [request.get('text')])
+
+
+def train_sentencepiece(corpus_path: str, src: str, output_dir: str, vocab_size: int) -> str:
+    import sentencepiece as spm
+
+    text_path = os.path.join(output_dir, 'train.txt')
+    with open(text_path, 'w', encoding='utf-8') as f:
+        for text in corpus_texts(corpus_path, src):
+            f.write(text + '\n')
+
+    model_prefix = os.path.join(output_dir, 'sentencepiece')
+    spm.SentencePieceTrainer.train(
+        input=text_path,
+        model_prefix=model_prefix,
+        vocab_size=vocab_size,
+        hard_vocab_limit=False,
+        bos_id=-1,
+        eos_id=-1,
+    )
+    os.remove(text_path)
+    return model_prefix
+
+
+def _resolve(spec, path: str):
+    # 'encoder/layer_0/self_attention/linear_1' -> spec.encoder.layer[0].self_attention.linear[1]
+    scope = spec
+    for name in path.split('/'):
+        match = re.fullmatch(r'(.+)_(\d+)', name)
+        if match and isinstance(getattr(scope, match.group(1), None), list):
+            scope = getattr(scope, match.group(1))[int(match.group(2))]
+        else:
+            scope = getattr(scope, name)
+    return scope
+
+
+def build_model(
+    vocabulary, output_dir: str, d_model: int, ffn: int, num_layers: int, eos_bias: float, seed: int
+) -> None:
+    from ctranslate2.specs import transformer_spec
+
+    spec = transformer_spec.TransformerSpec.from_config(num_layers=num_layers, num_heads=2)
+    rng = np.random.default_rng(seed)
+    shapes = {
+        'embeddings_0/weight': (len(vocabulary), d_model),
+        'embeddings/weight': (len(vocabulary), d_model),
+        'projection/weight': (len(vocabulary), d_model),
+        'self_attention/linear_0/weight': (3 * d_model, d_model),
+        'self_attention/linear_1/weight': (d_model, d_model),
+        'attention/linear_0/weight': (d_model, d_model),
+        'attention/linear_1/weight': (2 * d_model, d_model),
+        'attention/linear_2/weight': (d_model, d_model),
+        'ffn/linear_0/weight': (ffn, d_model),
+        'ffn/linear_1/weight': (d_model, ffn),
+    }
+
+    for name, value in spec.variables().items():
+        if value is not None:
+            continue
+        scope_path, attribute = name.rsplit('/', 1)
+        if attribute == 'gamma':
+            value = np.ones(d_model, dtype=np.float32)
+        elif attribute == 'beta':
+            value = np.zeros(d_model, dtype=np.float32)
+        else:
+            shape = next(s for suffix, s in shapes.items() if name.endswith(suffix))
+            value = rng.normal(0, 0.1, shape).astype(np.float32)
+        setattr(_resolve(spec, scope_path), attribute, value)
+
+    # A random decoder never picks </s> on its own and would always decode
+    # up to the maximum length. Favouring </s> gives sentence-like lengths
+    projection_bias = np.zeros(len(vocabulary), dtype=np.float32)
+    projection_bias[vocabulary.index('</s>')] = eos_bias
+    spec.decoder.projection.bias = projection_bias
+
+    spec.register_source_vocabulary(vocabulary)
+    spec.register_target_vocabulary(vocabulary)
+    spec.validate()
+    spec.optimize()
+    spec.save(output_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    parser.add_argument('--src', default='en')
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--vocab-size', type=int, default=500)
+    parser.add_argument('--d-model', type=int, default=64)
+    parser.add_argument('--ffn', type=int, default=256)
+    parser.add_argument('--num-layers', type=int, default=2)
+    parser.add_argument('--eos-bias', type=float, default=0.8)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    model_prefix = train_sentencepiece(args.corpus, args.src, args.output_dir, args.vocab_size)
+
+    with open(f'{model_prefix}.vocab', 'r', encoding='utf-8') as f:
+        pieces = [line.split('\t')[0] for line in f]
+    vocabulary = SPECIAL_TOKENS + [p for p in pieces if p not in SPECIAL_TOKENS]
+
+    build_model(
+        vocabulary, args.output_dir, args.d_model, args.ffn, args.num_layers, args.eos_bias, args.seed
+    )
+    print(f'Tiny CTranslate2 model written to {args.output_dir}')
+
+
+if __name__ == '__main__':
+    main()
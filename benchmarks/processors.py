@@ -0,0 +1,258 @@
+"""
+Micro-benchmarks of the sentence pre/postprocessors in app/utils
+(segmenters.py, tokenizers.py and utils.py) over Latin, Ge'ez and Arabic
+script corpora in benchmarks/corpora. BPE codes and sentencepiece models
+are trained on each corpus beforehand, outside of the timings.
+
+Processors are timed the way pipeline.py installs them: preprocessors and
+postprocessors are called on the sentence batch of each paragraph, the
+sentence segmenter on each paragraph. Reports the best-of-N time per
+sentence (per paragraph for sentence segmenters) of every processor, and its cost
+relative to a fixed pure-Python reference workload, timed interleaved with it.
+The relative cost is what gets compared with the stored baseline, which
+takes out most of the difference in speed between machines and runs. With
+--check, exits with an error when a processor's relative cost went up by
+more than the threshold. Regenerate the baseline with --update-baseline
+after intended changes.
+
+    python -m benchmarks.processors --check
+    python -m benchmarks.processors --update-baseline
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPORA_DIR = os.path.join(BENCHMARKS_DIR, 'corpora')
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, 'baselines', 'processors.json')
+
+# Corpus name -> language used for the Moses tokenizer
+CORPORA = {
+    'latin': 'en',
+    'geez': 'am',
+    'arabic': 'ar',
+}
+
+SENTENCE_PUNCTUATION = ['.', '?', '!', '።', '፧', '؟']
+
+
+def load_corpus(name: str) -> List[str]:
+    with open(os.path.join(CORPORA_DIR, f'{name}.txt'), 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def train_bpe(sentences: List[str], work_dir: str, num_symbols: int = 500):
+    from subword_nmt.learn_bpe import learn_bpe
+
+    from app.utils.segmenters import load_bpe
+
+    codes_path = os.path.join(work_dir, 'bpe.codes')
+    # learn_bpe reports its progress on stderr
+    with open(codes_path, 'w', encoding='utf-8') as codes, contextlib.redirect_stderr(io.StringIO()):
+        learn_bpe(sentences, codes, num_symbols)
+    return load_bpe(codes_path)
+
+
+def train_sentencepiece(sentences: List[str], work_dir: str, vocab_size: int = 300):
+    import sentencepiece as spm
+
+    from app.utils.segmenters import load_sentencepiece
+
+    text_path = os.path.join(work_dir, 'spm.txt')
+    with open(text_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(sentences) + '\n')
+    model_prefix = os.path.join(work_dir, 'spm')
+    spm.SentencePieceTrainer.train(
+        input=text_path,
+        model_prefix=model_prefix,
+        vocab_size=vocab_size,
+        hard_vocab_limit=False,
+        minloglevel=2,
+    )
+    return load_sentencepiece(f'{model_prefix}.model')
+
+
+def nltk_available() -> bool:
+    import nltk
+
+    try:
+        nltk.data.find('tokenizers/punkt')
+    except LookupError:
+        return False
+    return True
+
+
+def corpus_cases(name: str, lang: str, work_dir: str) -> List[Tuple[Callable, List, int]]:
+    """
+    (processor, inputs, items) triples, each processor set up and fed as
+    in the translation pipeline. Batch processors get the sentences of
+    each paragraph as one batch. items is the number of paragraphs or
+    sentences in inputs that the time gets divided by
+    """
+    from app.utils import segmenters, tokenizers
+    from app.utils.utils import batch_processor, capitalizer, lowercaser
+
+    paragraphs = load_corpus(name)
+    tokenizer = tokenizers.get_moses_tokenizer(lang)
+    sentence_segmenter = tokenizers.get_custom_tokenizer(SENTENCE_PUNCTUATION)
+
+    sentences = [sentence_segmenter(p) for p in paragraphs]
+    lowercased = [[lowercaser(s) for s in batch] for batch in sentences]
+    tokenized = [[tokenizer(s) for s in batch] for batch in lowercased]
+    num_sentences = sum(len(batch) for batch in sentences)
+
+    bpe_segmenter = batch_processor(segmenters.get_bpe_segmenter(
+        train_bpe([s for batch in tokenized for s in batch], work_dir)
+    ))
+    sp = train_sentencepiece([s for batch in sentences for s in batch], work_dir)
+    sp_segmenter = segmenters.get_sentencepiece_batch_segmenter(sp)
+    token_segmenter = batch_processor(segmenters.token_segmenter)
+
+    batch_cases = [
+        (batch_processor(lowercaser), sentences),
+        (batch_processor(tokenizer), lowercased),
+        (token_segmenter, tokenized),
+        (bpe_segmenter, tokenized),
+        (sp_segmenter, sentences),
+        (batch_processor(segmenters.token_desegmenter), [token_segmenter(b) for b in tokenized]),
+        (batch_processor(segmenters.desegmenter), [bpe_segmenter(b) for b in tokenized]),
+        (segmenters.get_sentencepiece_batch_desegmenter(sp), [sp_segmenter(b) for b in sentences]),
+        (batch_processor(tokenizers.get_moses_detokenizer(lang)), tokenized),
+        (batch_processor(capitalizer), lowercased),
+    ]
+    cases = [(sentence_segmenter, paragraphs, len(paragraphs))]
+    cases += [(fn, batches, num_sentences) for fn, batches in batch_cases]
+    if nltk_available():
+        punkt = segmenters.load_punkt(segmenters.punkt_language(lang))
+        cases.insert(0, (segmenters.get_nltk_sentence_segmenter(punkt), paragraphs, len(paragraphs)))
+    return cases
+
+
+REFERENCE_INPUTS = [f'Reference sentence number {i} of the benchmark.' for i in range(100)]
+
+
+def _reference_workload(text: str) -> int:
+    return len(' '.join(reversed(text.lower().split())).replace(' ', '_'))
+
+
+def _time_passes(fn: Callable, inputs: List, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        for x in inputs:
+            fn(x)
+    return time.perf_counter() - start
+
+
+def _calibrate(fn: Callable, inputs: List, min_time: float) -> int:
+    # Number of passes over the inputs that takes at least min_time
+    number = 1
+    while _time_passes(fn, inputs, number) < min_time:
+        number *= 2
+    return number
+
+
+def time_per_item(fn: Callable, inputs: List, items: int, repeat: int, min_time: float) -> Tuple[float, float]:
+    """
+    Best-of-`repeat` seconds per item of `fn` called on each of `inputs`,
+    which hold `items` items, and of the reference workload. Their
+    measurements are interleaved so that both see the same load
+    """
+    number = _calibrate(fn, inputs, min_time)
+    reference_number = _calibrate(_reference_workload, REFERENCE_INPUTS, min_time)
+
+    best = reference_best = float('inf')
+    for _ in range(repeat):
+        reference_best = min(reference_best, _time_passes(_reference_workload, REFERENCE_INPUTS, reference_number))
+        best = min(best, _time_passes(fn, inputs, number))
+    return (
+        best / (number * items),
+        reference_best / (reference_number * len(REFERENCE_INPUTS)),
+    )
+
+
+def run_benchmarks(repeat: int, min_time: float, corpora: List[str]) -> Dict[str, Dict[str, float]]:
+    """
+    Microseconds per item and cost relative to the reference workload for
+    every corpus/processor
+    """
+    results = {}
+    for name in corpora:
+        with tempfile.TemporaryDirectory() as work_dir:
+            for fn, inputs, items in corpus_cases(name, CORPORA[name], work_dir):
+                seconds, reference = time_per_item(fn, inputs, items, repeat, min_time)
+                results[f'{name}/{fn.__name__}'] = {
+                    'us': seconds * 1e6,
+                    'relative': seconds / reference,
+                }
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, float], threshold: float) -> List[str]:
+    regressions = []
+    print(f"{'processor':<42}{'us/item':>10}{'relative':>10}{'baseline':>10}{'change':>9}")
+    for key, result in results.items():
+        value = result['relative']
+        line = f"{key:<42}{result['us']:>10.2f}{value:>10.2f}"
+        base = baseline.get(key)
+        if base is None:
+            print(f'{line}{"-":>10}{"new":>9}')
+            continue
+        change = value / base - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(f'{key}: {value:.2f}, baseline {base:.2f} ({change:+.0%})')
+        print(f'{line}{base:>10.2f}{change:>+9.0%}{flag}')
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--check', action='store_true', help='Fail on regressions from the baseline')
+    parser.add_argument('--update-baseline', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=None,
+                        help='Allowed slowdown before failing (default: from the baseline file, else 0.5)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05, help='Minimum seconds per measurement')
+    parser.add_argument('--corpus', action='append', choices=list(CORPORA), help='Corpora to run (default: all)')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.repeat, args.min_time, args.corpus or list(CORPORA))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    threshold = args.threshold if args.threshold is not None else baseline.get('threshold', 0.5)
+
+    regressions = compare(results, baseline.get('results', {}), threshold)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'threshold': threshold,
+                'machine': f'{platform.machine()} {platform.processor()}'.strip(),
+                'python': platform.python_version(),
+                'results': {k: round(v['relative'], 3) for k, v in results.items()},
+            }, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f'\nBaseline written to {args.baseline}')
+
+    if args.check and regressions:
+        print(f'\nProcessors slower than baseline by more than {threshold:.0%}:', file=sys.stderr)
+        print('  ' + '\n  '.join(regressions), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""
+Replays a JSONL request corpus against the translation API and reports
+throughput, latency percentiles and the time spent in each pipeline stage
+(from the /metrics endpoint).
+
+Each corpus line is one request, with the endpoint and its JSON body:
+
+    {"endpoint": "translate", "src": "en", "tgt": "fr", "text": "..."}
+    {"endpoint": "batch", "src": "en", "tgt": "fr", "texts": ["...", "..."]}
+
+By default the app runs in-process with benchmarks/config.json, which uses
+dummy models and the tiny CTranslate2 model built by
+`python -m benchmarks.make_tiny_ct2_model`. With --url, requests are sent
+to a running server instead.
+
+    python -m benchmarks.replay --concurrency 8 --repeat 5
+    python -m benchmarks.replay --url http://127.0.0.1:8001 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(BENCHMARKS_DIR, 'requests.jsonl')
+DEFAULT_CONFIG = os.path.join(BENCHMARKS_DIR, 'config.json')
+DEFAULT_MODELS_ROOT = os.path.join(BENCHMARKS_DIR, 'models')
+
+ENDPOINTS = {
+    'translate': '/api/v1/translate',
+    'batch': '/api/v1/translate/batch',
+    'stream': '/api/v1/translate/stream',
+}
+
+
+def load_corpus(corpus_path: str) -> List[Dict]:
+    with open(corpus_path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def parse_metrics(text: str) -> Dict:
+    from prometheus_client.parser import text_string_to_metric_families
+
+    stages: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0.0, 0.0])
+    sentences = 0.0
+    for family in text_string_to_metric_families(text):
+        for sample in family.samples:
+            if sample.name == 'mt_api_sentences_total':
+                sentences += sample.value
+            elif sample.name == 'mt_api_stage_seconds_sum':
+                stages[sample.labels['model_id'], sample.labels['stage']][0] += sample.value
+            elif sample.name == 'mt_api_stage_seconds_count':
+                stages[sample.labels['model_id'], sample.labels['stage']][1] += sample.value
+    return {'sentences': sentences, 'stages': dict(stages)}
+
+
+def inprocess_client(config_path: str, models_root: str, cache: bool) -> httpx.AsyncClient:
+    # Settings are read from the environment at import time
+    os.environ['MODELS_ROOT'] = models_root
+    if not cache:
+        os.environ['MT_API_CACHE_SIZE'] = '0'
+        os.environ['MT_API_CACHE_DIR'] = ''
+
+    from app.helpers.config import Config
+    from main import app
+
+    with open(config_path, 'r') as f:
+        Config(config_data=json.load(f), load_all_models=True)
+
+    return httpx.AsyncClient(app=app, base_url='http://benchmark', timeout=None)
+
+
+async def replay(
+    client: httpx.AsyncClient, requests: List[Dict], concurrency: int
+) -> List[Tuple[str, float, bool]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(request: Dict) -> Tuple[str, float, bool]:
+        endpoint = request['endpoint']
+        body = {k: v for k, v in request.items() if k != 'endpoint'}
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(ENDPOINTS[endpoint], json=body)
+            await response.aread()
+            return endpoint, time.perf_counter() - start, response.status_code == 200
+
+    return await asyncio.gather(*(send(request) for request in requests))
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    return {
+        'requests': len(latencies),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+
+def build_report(
+    results: List[Tuple[str, float, bool]], elapsed: float, before: Dict, after: Dict
+) -> Dict:
+    sentences = after['sentences'] - before['sentences']
+    by_endpoint: Dict[str, List[float]] = defaultdict(list)
+    for endpoint, latency, _ in results:
+        by_endpoint[endpoint].append(latency)
+
+    stages = []
+    for key, (seconds, count) in after['stages'].items():
+        before_seconds, before_count = before['stages'].get(key, (0.0, 0.0))
+        seconds, count = seconds - before_seconds, count - before_count
+        if count:
+            stages.append({
+                'model_id': key[0],
+                'stage': key[1],
+                'seconds': seconds,
+                'calls': int(count),
+                'mean_ms': seconds / count * 1000,
+            })
+    stages.sort(key=lambda s: -s['seconds'])
+
+    return {
+        'requests': len(results),
+        'errors': sum(1 for _, _, ok in results if not ok),
+        'elapsed_s': elapsed,
+        'sentences': int(sentences),
+        'sentences_per_sec': sentences / elapsed if elapsed else 0.0,
+        'requests_per_sec': len(results) / elapsed if elapsed else 0.0,
+        'latency': latency_summary([latency for _, latency, _ in results]),
+        'latency_by_endpoint': {e: latency_summary(l) for e, l in by_endpoint.items()},
+        'stages': stages,
+    }
+
+
+def print_report(report: Dict) -> None:
+    print(
+        f"{report['requests']} requests ({report['errors']} errors), "
+        f"{report['sentences']} sentences in {report['elapsed_s']:.2f}s: "
+        f"{report['sentences_per_sec']:.1f} sentences/s, {report['requests_per_sec']:.1f} requests/s"
+    )
+    print(f"\n{'endpoint':<12}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    rows = [('all', report['latency'])] + sorted(report['latency_by_endpoint'].items())
+    for endpoint, latency in rows:
+        print(
+            f"{endpoint:<12}{latency['requests']:>10}{latency['p50_ms']:>10.1f}"
+            f"{latency['p95_ms']:>10.1f}{latency['p99_ms']:>10.1f}"
+        )
+
+    total = sum(s['seconds'] for s in report['stages']) or 1
+    print(f"\n{'model':<10}{'stage':<40}{'calls':>8}{'mean ms':>10}{'share':>8}")
+    for s in report['stages']:
+        print(
+            f"{s['model_id']:<10}{s['stage']:<40}{s['calls']:>8}"
+            f"{s['mean_ms']:>10.2f}{s['seconds'] / total:>8.1%}"
+        )
+
+
+def check_baseline(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    if report['sentences_per_sec'] < baseline['sentences_per_sec'] * (1 - tolerance):
+        regressions.append(
+            f"throughput {report['sentences_per_sec']:.1f} sentences/s, "
+            f"baseline {baseline['sentences_per_sec']:.1f}"
+        )
+    for p in ('p50_ms', 'p95_ms', 'p99_ms'):
+        if report['latency'][p] > baseline['latency'][p] * (1 + tolerance):
+            regressions.append(
+                f"{p} {report['latency'][p]:.1f}, baseline {baseline['latency'][p]:.1f}"
+            )
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    corpus = load_corpus(args.corpus)
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=None)
+    else:
+        client = inprocess_client(args.config, args.models_root, args.cache)
+
+    async with client:
+        for _ in range(args.warmup):
+            await replay(client, corpus, args.concurrency)
+
+        before = parse_metrics((await client.get('/metrics')).text)
+        start = time.perf_counter()
+        results = await replay(client, corpus * args.repeat, args.concurrency)
+        elapsed = time.perf_counter() - start
+        after = parse_metrics((await client.get('/metrics')).text)
+
+    return build_report(results, elapsed, before, after)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='JSONL request corpus')
+    parser.add_argument('--url', help='Base URL of a running server. The app runs in-process when omitted')
+    parser.add_argument('--config', default=DEFAULT_CONFIG, help='Model config for in-process runs')
+    parser.add_argument('--models-root', default=DEFAULT_MODELS_ROOT, help='Models directory for in-process runs')
+    parser.add_argument('--cache', action='store_true', help='Keep the translation caches on for in-process runs')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=3, help='Number of passes over the corpus')
+    parser.add_argument('--warmup', type=int, default=1, help='Unmeasured passes over the corpus')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    parser.add_argument('--baseline', help='Fail if the results regress from this JSON report')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed regression from the baseline')
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if report['errors']:
+        print(f"\n{report['errors']} requests failed", file=sys.stderr)
+        return 1
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = check_baseline(report, json.load(f), args.tolerance)
+        if regressions:
+            print('\nRegressions from baseline:\n  ' + '\n  '.join(regressions), file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Times the custom punctuation sentence splitter (`sentence_split` lists in
+the model config) on multi-megabyte documents built from the corpora in
+benchmarks/corpora, against the character by character splitter it
+replaced. Both must return the same sentences.
+
+    python -m benchmarks.sentence_split --size-mb 4
+"""
+import argparse
+import sys
+import time
+from typing import Callable, List, Optional
+
+from benchmarks.processors import CORPORA, load_corpus
+
+# Punctuation list of the Tigrinya models, see "Sentence splitting" in README.md
+TI_PUNKSET = ['፧', '።', '፨', '?', '!', ':', '“', '”', '"', '—', '-']
+PUNKSET = TI_PUNKSET + ['.', '؟']
+
+
+def char_loop_tokenize(doc: str, punkset: List[str]) -> List[str]:
+    tokens = []
+    doc = ' '.join(doc.split())
+
+    curr_sent = ''
+    for c in doc:
+        if c in punkset:
+            curr_sent += c
+            if curr_sent:
+                tokens.append(curr_sent.strip())
+                curr_sent = ''
+        else:
+            curr_sent += c
+    if curr_sent:
+        tokens.append(curr_sent.strip())
+
+    return tokens
+
+
+def build_document(corpus: str, size_mb: float) -> str:
+    paragraphs = load_corpus(corpus)
+    text = '\n'.join(paragraphs)
+    size = int(size_mb * 2 ** 20)
+    return '\n'.join([text] * (size // len(text.encode('utf-8')) + 1))
+
+
+def best_time(fn: Callable, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from app.utils.tokenizers import get_custom_tokenizer
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=float, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--corpus', action='append', choices=list(CORPORA), help='Corpora to run (default: all)')
+    args = parser.parse_args(argv)
+
+    segmenter = get_custom_tokenizer(PUNKSET)
+    print(f"{'corpus':<10}{'MB':>6}{'sentences':>11}{'char loop s':>13}{'compiled s':>12}{'speedup':>9}")
+    for corpus in args.corpus or list(CORPORA):
+        doc = build_document(corpus, args.size_mb)
+        expected = char_loop_tokenize(doc, PUNKSET)
+        if segmenter(doc) != expected:
+            print(f'{corpus}: compiled splitter output differs from the char loop', file=sys.stderr)
+            return 1
+
+        loop_seconds = best_time(lambda: char_loop_tokenize(doc, PUNKSET), args.repeat)
+        compiled_seconds = best_time(lambda: segmenter(doc), args.repeat)
+        print(
+            f"{corpus:<10}{len(doc.encode('utf-8')) / 2 ** 20:>6.1f}{len(expected):>11}"
+            f"{loop_seconds:>13.3f}{compiled_seconds:>12.3f}{loop_seconds / compiled_seconds:>8.1f}x"
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,31 @@
+"""
+Inference server for multi-worker deployments. Loads the translation models
+of the config once and serves them to the API workers, which are pointed at
+it with the same MT_API_INFERENCE_SOCKET:
+
+    MT_API_INFERENCE_AUTHKEY=... MT_API_INFERENCE_SOCKET=/tmp/mt-api.sock python inference_server.py
+    MT_API_INFERENCE_AUTHKEY=... MT_API_INFERENCE_SOCKET=/tmp/mt-api.sock uvicorn main:app --workers 4
+"""
+import logging
+import signal
+import sys
+
+from app.helpers.log import setup_logging
+from app.settings import INFERENCE_SERVER_ADDRESS, INFERENCE_SERVER_AUTHKEY, SERVE_WHILE_LOADING
+
+if __name__ == '__main__':
+    if not INFERENCE_SERVER_ADDRESS:
+        sys.exit('Set MT_API_INFERENCE_SOCKET to the address to listen on')
+    if not INFERENCE_SERVER_AUTHKEY:
+        sys.exit('Set MT_API_INFERENCE_AUTHKEY to a secret key shared with the API workers')
+
+    from app.utils.inference_server import InferenceServer
+
+    logging.basicConfig(format='%(levelname)-8s | %(message)s', level=logging.INFO)
+    setup_logging()
+    # Exit through serve_forever's cleanup, which removes the socket file
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+
+    InferenceServer(INFERENCE_SERVER_ADDRESS, INFERENCE_SERVER_AUTHKEY).serve_forever(
+        background_load=SERVE_WHILE_LOADING,
+    )